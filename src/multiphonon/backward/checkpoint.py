@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+#
+
+
+"""checkpoints of the sqe2dos iteration
+
+After each round, sqe2dos can save the state it needs to continue the
+iteration to workdir/checkpoint.h5:
+
+* the DOS of the round
+* the experimental S(Q,E), as rescaled by the iteration so far
+* the corrected and the residual S(Q,E) of the round
+* the round number, and whether the iteration has converged
+* the parameters of the run, and a fingerprint of the input S(Q,E)
+
+The file is replaced atomically, so it always holds the last complete
+round. This is enough to resume the iteration, or to redo the final
+error-bar and dirty-DOS steps, without repeating any round.
+"""
+
+import json
+import os
+
+import numpy as np
+
+CHECKPOINT_FILENAME = "checkpoint.h5"
+
+
+class Checkpoint:
+    """State of the sqe2dos iteration after a complete round"""
+
+    def __init__(self, roundno, converged, parameters, sqe, corrected_sqe, residual_sqe, dos):
+        self.roundno = roundno
+        self.converged = converged
+        self.parameters = parameters
+        self.sqe = sqe
+        self.corrected_sqe = corrected_sqe
+        self.residual_sqe = residual_sqe
+        self.dos = dos
+        return
+
+
+def parameters(sqe, **kwds):
+    """Parameters identifying a sqe2dos run: the keyword arguments and a fingerprint of the input S(Q,E)"""
+    from ..forward.cache import fingerprint
+
+    d = dict(kwds)
+    d["sqe"] = fingerprint(sqe.Q, sqe.E, sqe.I, sqe.E2)
+    # normalize to what json gives back. tuples become lists
+    return json.loads(json.dumps(d, default=_tojson))
+
+
+def _tojson(o):
+    # numpy scalars and arrays
+    if hasattr(o, "tolist"):
+        return o.tolist()
+    raise TypeError("%r is not JSON serializable" % (o,))
+
+
+def save(path, checkpoint):
+    """Save a checkpoint, replacing the existing file atomically"""
+    import h5py
+
+    tmp = path + ".tmp"
+    with h5py.File(tmp, "w") as f:
+        f.attrs["roundno"] = checkpoint.roundno
+        f.attrs["converged"] = checkpoint.converged
+        f.attrs["parameters"] = json.dumps(checkpoint.parameters)
+        for name in "sqe", "corrected_sqe", "residual_sqe":
+            hist = getattr(checkpoint, name)
+            g = f.create_group(name)
+            g.create_dataset("I", data=hist.I, compression="gzip", shuffle=True)
+            g.create_dataset("E2", data=hist.E2, compression="gzip", shuffle=True)
+            continue
+        g = f.create_group("dos")
+        g["E"] = checkpoint.dos.E
+        g["I"] = checkpoint.dos.I
+        g["E2"] = checkpoint.dos.E2
+    os.replace(tmp, path)
+    return
+
+
+def load(path, sqe):
+    """Load a checkpoint. Returns None if there is no checkpoint
+
+    Parameters
+    ----------
+    path: str
+        path to the checkpoint file
+
+    sqe: histogram
+        input S(Q,E) of the run. Provides the axes of the saved S(Q,E)s
+
+    """
+    if not os.path.exists(path):
+        return
+    import h5py
+    import histogram as H
+
+    def _sqe(g):
+        hist = sqe.copy()
+        hist.I[:] = g["I"][:]
+        hist.E2[:] = g["E2"][:]
+        return hist
+
+    with h5py.File(path, "r") as f:
+        roundno = int(f.attrs["roundno"])
+        converged = bool(f.attrs["converged"])
+        params = json.loads(f.attrs["parameters"])
+        sqes = [_sqe(f[name]) for name in ("sqe", "corrected_sqe", "residual_sqe")]
+        g = f["dos"]
+        dos = H.histogram("DOS", [("E", g["E"][:], "meV")], data=g["I"][:], errors=g["E2"][:])
+    return Checkpoint(roundno, converged, params, *sqes, dos=dos)
+
+
+def mismatches(saved, current):
+    """Return the names of the parameters that differ between two parameter dictionaries"""
+    keys = sorted(set(saved) | set(current))
+    return [k for k in keys if not _equal(saved.get(k), current.get(k))]
+
+
+def _equal(a, b):
+    if isinstance(a, (list, float, int)) and isinstance(b, (list, float, int)):
+        try:
+            return np.allclose(a, b, rtol=1e-12, atol=0)
+        except (TypeError, ValueError):
+            return False
+    return a == b
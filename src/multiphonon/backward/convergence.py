@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+#
+
+
+"""convergence metrics and stopping rules of the sqe2dos iteration
+
+sqe2dos(records=True) yields a RoundRecord with the DOS of every round.
+Stopping rules are callables rule(record, history) that return a reason
+to stop (a str), or None to go on. history is the list of records
+of the previous rounds of this run.
+"""
+
+import time
+
+import numpy as np
+
+
+class RoundRecord:
+    """Metrics of one round of sqe2dos
+
+    Attributes
+    ----------
+    roundno: int
+        round number
+
+    l1, l2, max: float
+        L1 norm, L2 norm and maximum of the absolute change of the DOS from the previous round.
+        NaN in the first round of a run without initial DOS
+
+    relative_change: float
+        l2 divided by the L2 norm of the DOS
+
+    residual_norm: float
+        L2 norm of the residual S(E) at E above the elastic cutoff,
+        relative to that of the experimental S(E)
+
+    mixing_residual: float
+        relative residual norm recorded by the mixer. See multiphonon.backward.mixing
+
+    phonon_order: int
+        order of the phonon expansion of the forward model
+
+    timings: dict
+        wall time (seconds) of the stages of the round: singlephonon, forward, correction, output
+
+    elapsed: float
+        wall time (seconds) since the start of the run
+
+    stop: str
+        the reason the iteration stops after this round, or None
+
+    """
+
+    def __init__(self, roundno):
+        self.roundno = roundno
+        self.l1 = self.l2 = self.max = self.relative_change = np.nan
+        self.residual_norm = self.mixing_residual = np.nan
+        self.phonon_order = None
+        self.timings = {}
+        self.elapsed = 0.0
+        self.stop = None
+        return
+
+    def to_dict(self):
+        return dict(self.__dict__, timings=dict(self.timings))
+
+    def __repr__(self):
+        """String representation"""
+        return "RoundRecord(%s)" % ", ".join("%s=%r" % item for item in self.to_dict().items())
+
+
+class Stopwatch:
+    """Measure the wall time of the stages of a round into a dictionary"""
+
+    def __init__(self, timings):
+        self.timings = timings
+        self._start = time.perf_counter()
+        return
+
+    def lap(self, stage):
+        now = time.perf_counter()
+        self.timings[stage] = self.timings.get(stage, 0.0) + now - self._start
+        self._start = now
+        return
+
+
+def dosChange(record, dos, prev_dos):
+    """Fill in the change of the DOS from the previous round"""
+    if prev_dos is None:
+        return
+    diff = np.abs(dos.I - prev_dos.I)
+    record.l1 = diff.sum()
+    record.l2 = np.linalg.norm(diff)
+    record.max = diff.max()
+    norm = np.linalg.norm(dos.I)
+    record.relative_change = record.l2 / norm if norm else np.nan
+    return
+
+
+def residualNorm(residual_sqe, exp_sqe, Emin):
+    """Relative L2 norm of the residual S(E) at E>Emin"""
+    positive = residual_sqe.E > Emin
+    residual_se = np.nansum(residual_sqe.I[:, positive], axis=0)
+    exp_se = np.nansum(exp_sqe.I[:, positive], axis=0)
+    norm = np.linalg.norm(exp_se)
+    return np.linalg.norm(residual_se) / norm if norm else np.nan
+
+
+class RelativeNorm:
+    """Stop when the relative L2 change of the DOS falls below rtol"""
+
+    def __init__(self, rtol=1e-3):
+        self.rtol = rtol
+        return
+
+    def __call__(self, record, history):
+        if record.relative_change < self.rtol:
+            return "relative change %.3g < %s" % (record.relative_change, self.rtol)
+        return
+
+
+class Stagnation:
+    """Stop when the residual norm improved by less than a fraction over the last rounds
+
+    Parameters
+    ----------
+    window: int
+        number of rounds to look back
+
+    min_improvement: float
+        minimum relative decrease of the residual norm over the window
+
+    """
+
+    def __init__(self, window=3, min_improvement=0.01):
+        self.window = window
+        self.min_improvement = min_improvement
+        return
+
+    def __call__(self, record, history):
+        if len(history) < self.window:
+            return
+        before = history[-self.window].residual_norm
+        now = record.residual_norm
+        if before - now < self.min_improvement * before:
+            return "residual norm stagnated at %.3g over %s rounds" % (now, self.window)
+        return
+
+
+class TimeBudget:
+    """Stop when the run has taken more than the given wall time (seconds)"""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        return
+
+    def __call__(self, record, history):
+        if record.elapsed > self.seconds:
+            return "time budget of %s seconds used up" % (self.seconds,)
+        return
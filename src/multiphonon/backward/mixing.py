@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+#
+
+
+"""update schemes for the sqe2dos fixed-point iteration
+
+Each round of sqe2dos maps the current DOS x to a new DOS g = G(x),
+stitched by update_dos. A mixer decides the DOS actually kept in the
+energy range updated from the measurement:
+
+* PlainMixing: g. This is the plain fixed-point iteration
+* DampedMixing: x + alpha * (g - x)
+* AndersonMixing: Anderson acceleration (also known as DIIS) over the last k iterates
+
+The area of the updated range is set by update_dos, so mixers work on
+shapes: x and g are normalized to unit sum before mixing, and the result
+is given the scale of g. The result is zero wherever g is. update_dos
+multiplies the DOS by a ratio, so such points are zero at the fixed point.
+
+Every mixer records the relative residual norm |g - x| / |x| of each round
+in its residual_norms list.
+"""
+
+import numpy as np
+
+
+class PlainMixing:
+    """Plain fixed-point iteration: take the new estimate as is"""
+
+    def __init__(self):
+        self.residual_norms = []
+        return
+
+    def __call__(self, x, g):
+        """Return the DOS to use for the next round
+
+        Parameters
+        ----------
+        x: numpy array
+            current DOS, in the energy range being updated
+
+        g: numpy array
+            new estimate of the DOS in the same energy range
+
+        """
+        x1, g1 = _normalized(x), _normalized(g)
+        self.residual_norms.append(residualNorm(x1, g1))
+        mixed = self.mix(x1, g1)
+        if mixed is g1:
+            return g
+        mixed = np.clip(mixed, 0, None)
+        # the update multiplies the DOS, so a zero of g stays zero in the plain iteration
+        mixed[g1 == 0] = 0
+        return _normalized(mixed) * g.sum()
+
+    def mix(self, x, g):
+        return g
+
+
+class DampedMixing(PlainMixing):
+    """Damped iteration: x + alpha * (g - x)
+
+    Parameters
+    ----------
+    alpha: float
+        0<alpha<=1. 1 is the plain iteration
+
+    """
+
+    def __init__(self, alpha=0.5):
+        if not 0 < alpha <= 1:
+            raise ValueError("alpha must be in (0, 1]: %s" % (alpha,))
+        super().__init__()
+        self.alpha = alpha
+        return
+
+    def mix(self, x, g):
+        return x + self.alpha * (g - x)
+
+
+class AndersonMixing(PlainMixing):
+    """Anderson acceleration (DIIS) over the last k iterates
+
+    The next DOS is the combination of the last k+1 iterates
+    that minimizes the linearized residual.
+
+    Parameters
+    ----------
+    depth: int
+        number k of previous iterates to use
+
+    alpha: float
+        mixing parameter. 1: the undamped Anderson scheme
+
+    rcond: float
+        cutoff for small singular values in the least-squares problem
+
+    """
+
+    def __init__(self, depth=5, alpha=1.0, rcond=1e-10):
+        if depth < 1:
+            raise ValueError("depth must be positive: %s" % (depth,))
+        super().__init__()
+        self.depth = depth
+        self.alpha = alpha
+        self.rcond = rcond
+        self._xs = []
+        self._fs = []
+        return
+
+    def mix(self, x, g):
+        f = g - x
+        if self._xs and self._xs[-1].shape != x.shape:
+            # the energy range changed. start over
+            del self._xs[:], self._fs[:]
+        self._xs.append(x)
+        self._fs.append(f)
+        del self._xs[: -self.depth - 1], self._fs[: -self.depth - 1]
+        mixed = x + self.alpha * f
+        if len(self._xs) > 1:
+            dX = np.diff(self._xs, axis=0).T
+            dF = np.diff(self._fs, axis=0).T
+            gamma = np.linalg.lstsq(dF, f, rcond=self.rcond)[0]
+            mixed = mixed - np.dot(dX + self.alpha * dF, gamma)
+        return mixed
+
+
+def createMixer(mixing=None):
+    """Create a mixer for sqe2dos
+
+    Parameters
+    ----------
+    mixing: str or mixer
+        None or "plain": PlainMixing. "damping": DampedMixing. "anderson": AndersonMixing.
+        A mixer instance is returned as is
+
+    """
+    if mixing is None or mixing == "plain":
+        return PlainMixing()
+    if mixing == "damping":
+        return DampedMixing()
+    if mixing == "anderson":
+        return AndersonMixing()
+    if isinstance(mixing, str):
+        raise ValueError("Unknown mixing scheme: %s" % (mixing,))
+    return mixing
+
+
+def residualNorm(x, g):
+    """Relative residual norm |g - x| / |x|"""
+    norm = np.linalg.norm(x)
+    return np.linalg.norm(g - x) / norm if norm else np.nan
+
+
+def _normalized(a):
+    s = a.sum()
+    return a / s if s else a
@@ -0,0 +1,260 @@
+#!/usr/bin/env python
+#
+
+"""joint refinement of one DOS against S(Q,E) measured at several incident energies
+
+A high Ei covers the whole phonon spectrum at coarse resolution, and a low
+Ei covers the low-energy part at fine resolution. Instead of running
+sqe2dos for each Ei in turn and passing the DOS on as initdos, sqe2dos
+here refines a single DOS against all datasets in every round:
+
+* every dataset computes a new estimate of the DOS in its own energy range
+  from its corrected S(Q,E), starting from the common DOS
+* the estimates are stitched into the common DOS with DOSStitcher,
+  from the highest Ei to the lowest, so the low-E part comes from the finest resolution
+* the multiphonon and multiple scattering corrections of every dataset
+  are computed from the new common DOS
+
+The per-dataset steps run concurrently in threads. They all start from the
+same DOS, so the A_n(E) terms of the forward model are computed once per
+round and shared through multiphonon.forward.cache.forward_cache.
+"""
+
+import os
+import time
+
+import histogram.hdf as hh
+
+from .singlephonon_sqe2dos import sqe2dos as singlephonon_sqe2dos
+from .sqe2dos import isclose, scale_expsqe_to_match_inel_se
+
+
+class Dataset:
+    """S(Q,E) measured at one incident energy
+
+    Parameters
+    ----------
+    sqe: histogram
+        S(Q,E)
+
+    Ei: float
+        Incident energy (meV)
+
+    Ecutoff: float
+        Maximum energy of the DOS to update from this dataset
+
+    elastic_E_cutoff: 2-tuple of floats
+        cutoff for elastic peak (meV)
+
+    C_ms: float
+        MS = C_ms * MP. None: the C_ms given to sqe2dos
+
+    """
+
+    def __init__(self, sqe, Ei, Ecutoff, elastic_E_cutoff, C_ms=None):
+        self.sqe = sqe
+        self.Ei = Ei
+        self.Ecutoff = Ecutoff
+        self.elastic_E_cutoff = elastic_E_cutoff
+        self.C_ms = C_ms
+        return
+
+
+def sqe2dos(
+    datasets,
+    T,
+    M,
+    C_ms=None,
+    workdir="work",
+    MAX_ITERATION=20,
+    TOLERATION=1e-4,
+    initdos=None,
+    update_strategy_weights=None,
+    workers=None,
+    records=False,
+    stop=None,
+    dtype="d",
+    phonon_order_tol=None,
+):
+    """Given S(Q,E) at several incident energies, compute one DOS
+
+    This is an iterator. It yields the common DOS of every round.
+
+    Parameters
+    ----------
+    datasets: list
+        Dataset instances, or (sqe, Ei, Ecutoff, elastic_E_cutoff) tuples.
+        The energy axes of all S(Q,E) must have the same bin size and a bin center at zero.
+        The S(Q,E) are copied. The input histograms are not modified
+
+    T : float
+        Temperature (Kelvin)
+
+    M : float
+        Average atomic mass (u)
+
+    C_ms: float
+        MS = C_ms * MP, for datasets without their own C_ms
+
+    workdir : str
+        Work directory. The final DOS is saved to workdir/final-dos.h5,
+        and the final S(Q,E)s of every dataset to workdir/Ei_<Ei>
+
+    MAX_ITERATION: int
+        Max iteration
+
+    TOLERATION: float
+        Toleration for convergence test
+
+    initdos : histogram
+        initial guess of DOS. It must cover the energy range of the highest Ei.
+        None: a guess from the dataset of the highest Ei
+
+    update_strategy_weights : 2-tuple of floats
+        Weights for the update strategies (force continuity, area conservation)
+
+    workers: int
+        number of threads for the per-dataset steps. None: one per dataset
+
+    records: boolean
+        If True, yield (dos, record) instead of the DOS alone.
+        record is a multiphonon.backward.convergence.RoundRecord.
+        Its residual_norm is the largest residual norm of all datasets
+
+    stop: list of callables
+        Stopping rules checked after every round. See multiphonon.backward.convergence
+
+    dtype: numpy dtype
+        floating point type of the S(Q,E)s of the iteration. See multiphonon.backward.sqe2dos.sqe2dos
+
+    phonon_order_tol: float
+        tolerance for the order of the phonon expansion. See multiphonon.backward.sqe2dos.sqe2dos.
+        The phonon_order of the records is the largest order of all datasets
+
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    from . import convergence
+    from .stitch_dos import DOSStitcher
+
+    datasets = [d if isinstance(d, Dataset) else Dataset(*d) for d in datasets]
+    if not datasets:
+        raise ValueError("No datasets")
+    # highest Ei first. lower Ei refine the low energy part
+    datasets = sorted(datasets, key=lambda d: -d.Ei)
+    states = [_State(d, C_ms, dtype, phonon_order_tol) for d in datasets]
+    if initdos is None:
+        initdos = _guess_init_dos(states[0])
+    prev_dos = initdos
+    stitch = DOSStitcher(update_strategy_weights)
+    stop = list(stop or [])
+    history = []
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers or len(states)) as pool:
+        for roundno in range(MAX_ITERATION):
+            record = convergence.RoundRecord(roundno)
+            stopwatch = convergence.Stopwatch(record.timings)
+            # new estimates of the DOS from every dataset
+            estimates = list(pool.map(lambda s: s.singlephonon(prev_dos, T, M, update_strategy_weights), states))
+            stopwatch.lap("singlephonon")
+            dos = estimates[0]
+            for state, estimate in zip(states[1:], estimates[1:]):
+                dos = stitch(dos, estimate, 0.0, state.Emax)
+                continue
+            stopwatch.lap("stitch")
+            # corrections from the common DOS
+            residual_norms = list(pool.map(lambda s: s.forward(dos, T, M), states))
+            stopwatch.lap("forward")
+            converged = isclose(dos, prev_dos, TOLERATION)
+            convergence.dosChange(record, dos, prev_dos)
+            record.residual_norm = max(residual_norms)
+            record.phonon_order = max(state.phonon_order for state in states)
+            record.elapsed = time.perf_counter() - start_time
+            record.stop = "converged" if converged else None
+            for rule in stop:
+                record.stop = record.stop or rule(record, history)
+                continue
+            history.append(record)
+            if records:
+                yield dos, record
+            else:
+                yield dos
+            if record.stop:
+                break
+            prev_dos = dos
+            continue
+    # outputs
+    if not os.path.exists(workdir):
+        os.makedirs(workdir)
+    hh.dump(dos, os.path.join(workdir, "final-dos.h5"))
+    for state in states:
+        state.save(os.path.join(workdir, "Ei_%s" % (state.dataset.Ei,)))
+        continue
+    return
+
+
+class _State:
+    """Iteration state of one dataset"""
+
+    def __init__(self, dataset, C_ms, dtype, phonon_order_tol):
+        from ..sqe import astype
+
+        self.dataset = dataset
+        self.C_ms = C_ms if dataset.C_ms is None else dataset.C_ms
+        self.dtype = dtype
+        self.phonon_order_tol = phonon_order_tol
+        self.phonon_order = None
+        # the experimental sqe is rescaled in every round
+        self.sqe = astype(dataset.sqe, dtype)
+        self.corrected_sqe = self.sqe
+        self.residual_sqe = None
+        E = self.sqe.E
+        self.Emax = min(E[-1], dataset.Ecutoff)
+        return
+
+    def singlephonon(self, dos, T, M, update_weights):
+        d = self.dataset
+        return singlephonon_sqe2dos(
+            self.corrected_sqe,
+            T,
+            d.Ecutoff,
+            d.elastic_E_cutoff,
+            M,
+            initdos=dos,
+            update_weights=update_weights,
+            dtype=self.dtype,
+        )
+
+    def forward(self, dos, T, M):
+        """Compute the corrected S(Q,E) from the DOS. Returns the relative residual norm"""
+        from ..forward import dos2sqe
+        from .convergence import residualNorm
+
+        d = self.dataset
+        sqe = self.sqe
+        singlephonon_sqe, mpsqe, mssqe, tot_inel_sqe = dos2sqe(
+            dos, self.C_ms, sqe, T, M, d.Ei, dtype=self.dtype, tol=self.phonon_order_tol
+        )
+        self.phonon_order = mpsqe.getAttribute("phonon_order")
+        scale_expsqe_to_match_inel_se(sqe, tot_inel_sqe, d.elastic_E_cutoff[-1])
+        self.corrected_sqe = sqe + (mpsqe + mssqe) * (-1.0, 0)
+        self.residual_sqe = self.corrected_sqe + singlephonon_sqe * (-1.0, 0)
+        return residualNorm(self.residual_sqe, sqe, d.elastic_E_cutoff[-1])
+
+    def save(self, outdir):
+        if not os.path.exists(outdir):
+            os.makedirs(outdir)
+        hh.dump(self.sqe, os.path.join(outdir, "exp-sqe.h5"))
+        hh.dump(self.corrected_sqe, os.path.join(outdir, "corrected_sqe.h5"))
+        hh.dump(self.residual_sqe, os.path.join(outdir, "residual-sqe.h5"))
+        return
+
+
+def _guess_init_dos(state):
+    from .singlephonon_sqe2dos import guess_init_dos
+
+    E = state.sqe.E
+    dE = E[1] - E[0]
+    Eplus = E[E > -dE / 2].copy()
+    Eplus[0] = 0.0
+    return guess_init_dos(Eplus, state.dataset.Ecutoff)
@@ -4,6 +4,8 @@ import histogram.hdf as hh
 import matplotlib.pyplot as plt
 import numpy as np
 
+from .roundwriter import CONSOLIDATED_FILENAME, list_rounds, load_dos, load_sqe
+
 
 def plot_dos_iteration(curdir, total_rounds=None):
     """Plot the  DOS for each iteration
@@ -17,6 +19,20 @@ def plot_dos_iteration(curdir, total_rounds=None):
         number of iterations
 
     """
+    for round_no, dos in _iter_saved_dos(curdir, total_rounds):
+        plt.errorbar(dos.E, dos.I, dos.E2**0.5, label=str(round_no))
+        continue
+    plt.legend()
+    return
+
+
+def _iter_saved_dos(curdir, total_rounds=None):
+    # DOS of the saved rounds, either from the consolidated file or from round-N directories
+    consolidated = os.path.join(curdir, CONSOLIDATED_FILENAME)
+    if os.path.exists(consolidated):
+        for round_no in list_rounds(consolidated):
+            yield round_no, load_dos(consolidated, round_no)
+        return
     if total_rounds is None:
         import glob
 
@@ -26,13 +42,22 @@ def plot_dos_iteration(curdir, total_rounds=None):
     # mpl.rcParams['figure.figsize'] = 6,4.5
     for round_no in range(total_rounds):
         fn = os.path.join(curdir, "round-" + str(round_no), "dos.h5")
-        dos = hh.load(fn)
-        plt.errorbar(dos.E, dos.I, dos.E2**0.5, label=str(round_no))
+        # some rounds may be skipped by the intermediate output policy of sqe2dos
+        if not os.path.exists(fn):
+            continue
+        yield round_no, hh.load(fn)
         continue
-    plt.legend()
     return
 
 
+def _load_intermediate_sqe(curdir, fn, round_no=None):
+    # curdir is either a round-N directory, or a work directory with a consolidated file
+    consolidated = os.path.join(curdir, CONSOLIDATED_FILENAME)
+    if os.path.exists(consolidated):
+        return load_sqe(consolidated, fn, round_no)
+    return hh.load(os.path.join(curdir, fn))
+
+
 def plot_residual(curdir):
     """Plot the  residual DOS
 
@@ -52,14 +77,19 @@ def plot_residual(curdir):
     return
 
 
-def plot_intermediate_result_sqe(curdir):
+def plot_intermediate_result_sqe(curdir, round_no=None):
     """Plot the  intermediate S(Q,E)
 
     Parameters
     ----------
     curdir: str
         path to one of the iteration working directory for SQE->DOS calculation,
-        for example, work/round-5
+        for example, work/round-5.
+        Or path to the working directory, if the intermediate results
+        were saved in the consolidated file work/rounds.h5.
+
+    round_no: integer
+        round to plot from the consolidated file. Default: the last saved round
 
     """
     from ._sqe2dos_script_templates import plots_table as plots
@@ -67,13 +97,13 @@ def plot_intermediate_result_sqe(curdir):
     plots = plots.strip().splitlines()
     plots = [p.split() for p in plots]
 
-    Imax = np.nanmax(hh.load(os.path.join(curdir, "exp-sqe.h5")).I)
+    Imax = np.nanmax(_load_intermediate_sqe(curdir, "exp-sqe.h5", round_no).I)
     zmin = 0  # -Imax/100
     zmax = Imax / 30
 
     for index, (title, fn) in enumerate(plots):
         plt.subplot(3, 3, index + 1)
-        sqe = hh.load(os.path.join(curdir, fn))
+        sqe = _load_intermediate_sqe(curdir, fn, round_no)
         Q = sqe.Q
         E = sqe.E
         Y, X = np.meshgrid(E, Q)
@@ -90,14 +120,19 @@ def plot_intermediate_result_sqe(curdir):
     return
 
 
-def plot_intermediate_result_se(curdir):
+def plot_intermediate_result_se(curdir, round_no=None):
     """Plot the  intermediate S(E)
 
     Parameters
     ----------
     curdir: str
         path to one of the iteration working directory for SQE->DOS calculation,
-        for example, work/round-5
+        for example, work/round-5.
+        Or path to the working directory, if the intermediate results
+        were saved in the consolidated file work/rounds.h5.
+
+    round_no: integer
+        round to plot from the consolidated file. Default: the last saved round
 
     """
     # mpl.rcParams['figure.figsize'] = 12,9
@@ -107,7 +142,7 @@ def plot_intermediate_result_se(curdir):
     plots = [p.split() for p in plots]
 
     for index, (title, fn) in enumerate(plots):
-        sqe = hh.load(os.path.join(curdir, fn))
+        sqe = _load_intermediate_sqe(curdir, fn, round_no)
         Q = sqe.Q
         E = sqe.E
         I = sqe.I
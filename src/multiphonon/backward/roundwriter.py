@@ -0,0 +1,376 @@
+#!/usr/bin/env python
+#
+
+
+"""writers of the intermediate results of the sqe2dos iteration
+
+Each round of sqe2dos produces a set of S(Q,E) histograms and a DOS.
+An OutputPolicy decides which rounds are saved, and a writer saves them
+either as a round-N directory of histogram files (FilesRoundWriter),
+or appended to one chunked, compressed HDF5 file (HDF5RoundWriter).
+AsyncRoundWriter runs either of them in a background thread.
+"""
+
+import os
+import queue
+import sys
+import threading
+
+import numpy as np
+
+# name of the consolidated file in the work directory
+CONSOLIDATED_FILENAME = "rounds.h5"
+
+
+class OutputPolicy:
+    """Decide which rounds of sqe2dos are saved
+
+    Parameters
+    ----------
+    level: str or int
+        "all": every round. "none": no round. "final": only the last round.
+        integer k: every k-th round (0, k, 2k, ...) and the last round.
+
+    """
+
+    def __init__(self, level="all"):
+        if level not in ("all", "none", "final"):
+            if isinstance(level, bool) or not isinstance(level, (int, np.integer)) or level < 1:
+                raise ValueError("Invalid intermediate output level: %r" % (level,))
+        self.level = level
+        return
+
+    def should_write(self, roundno):
+        if self.level == "all":
+            return True
+        if self.level in ("none", "final"):
+            return False
+        return roundno % self.level == 0
+
+    @property
+    def write_final(self):
+        return self.level != "none"
+
+
+class FilesRoundWriter:
+    """Save each round into its own directory, workdir/round-N"""
+
+    def __init__(self, workdir):
+        self.workdir = workdir
+        return
+
+    def write(self, roundno, sqes, dos, mask):
+        """Save the intermediate results of one round
+
+        Parameters
+        ----------
+        roundno: int
+            round number
+
+        sqes: list of (name, histogram) tuples
+            S(Q,E) histograms of this round. name is the file name without extension
+
+        dos: histogram
+            DOS of this round
+
+        mask: numpy array of booleans
+            mask of the experimental S(Q,E). masked points are saved as NaN
+
+        """
+        import histogram.hdf as hh
+
+        from ._sqe2dos_script_templates import plot_intermediate_result_se_code, plot_intermediate_result_sqe_code
+        from .sqe2dos import create_script
+
+        cwd = self.rounddir(roundno)
+        if not os.path.exists(cwd):
+            os.makedirs(cwd)
+        for name, sqe in sqes:
+            sqe.I[mask] = np.nan
+            hh.dump(sqe, os.path.join(cwd, name + ".h5"))
+            continue
+        hh.dump(dos, os.path.join(cwd, "dos.h5"))
+        # write scripts
+        create_script(os.path.join(cwd, "plot_sqe.py"), plot_intermediate_result_sqe_code)
+        create_script(os.path.join(cwd, "plot_se.py"), plot_intermediate_result_se_code)
+        return
+
+    def rounddir(self, roundno):
+        return os.path.join(self.workdir, "round-%d" % roundno)
+
+    def close(self):
+        return
+
+
+class HDF5RoundWriter:
+    """Append the results of every saved round to workdir/rounds.h5
+
+    Layout of the file:
+
+    * /rounds: round numbers, shape (nrounds,)
+    * /Q, /E: axes of the S(Q,E) histograms
+    * /<name>/I, /<name>/E2: S(Q,E) of every saved round, shape (nrounds, nQ, nE)
+    * /dos/E: energy axis of the DOS
+    * /dos/I, /dos/E2: DOS of every saved round, shape (nrounds, nE_dos)
+
+    Datasets are chunked by round and gzip compressed. Every dataset
+    keeps the floating point type of the array it stores, so load_sqe and
+    load_dos return I and E2 in the types they were written with.
+
+    A new file is started for every run, unless resume_after is given.
+    Then the rounds up to and including resume_after are kept,
+    and new rounds are appended after them.
+    """
+
+    def __init__(self, workdir, compression="gzip", resume_after=None):
+        self.path = os.path.join(workdir, CONSOLIDATED_FILENAME)
+        self.compression = compression
+        self.resume_after = resume_after
+        self._file = None
+        if not os.path.exists(workdir):
+            os.makedirs(workdir)
+        return
+
+    def write(self, roundno, sqes, dos, mask):
+        """Append the intermediate results of one round. See FilesRoundWriter.write"""
+        f = self._open(sqes, dos)
+        n = f["rounds"].shape[0]
+        self._append(f["rounds"], n, roundno)
+        for name, sqe in sqes:
+            I = np.array(sqe.I)
+            I[mask] = np.nan
+            E2 = np.array(sqe.E2)
+            E2[mask] = np.nan
+            self._append(f[name]["I"], n, I)
+            self._append(f[name]["E2"], n, E2)
+            continue
+        self._append(f["dos"]["I"], n, dos.I)
+        self._append(f["dos"]["E2"], n, dos.E2)
+        f.flush()
+        return
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        return
+
+    def _open(self, sqes, dos):
+        if self._file is not None:
+            return self._file
+        import h5py
+
+        if self.resume_after is not None and os.path.exists(self.path):
+            f = self._file = h5py.File(self.path, "a")
+            self._truncate(f, self.resume_after)
+            return f
+        # start a new file for every run
+        f = self._file = h5py.File(self.path, "w")
+        f.create_dataset("rounds", shape=(0,), maxshape=(None,), dtype="i8")
+        sqe0 = sqes[0][1]
+        f["Q"] = sqe0.Q
+        f["E"] = sqe0.E
+        for name, sqe in sqes:
+            g = f.create_group(name)
+            for key in "I", "E2":
+                self._create(g, key, getattr(sqe, key))
+            continue
+        g = f.create_group("dos")
+        g["E"] = dos.E
+        for key in "I", "E2":
+            self._create(g, key, getattr(dos, key))
+        return f
+
+    def _truncate(self, f, last):
+        # drop the rounds after the last one to keep
+        import h5py
+
+        n = int((f["rounds"][:] <= last).sum())
+        datasets = [f["rounds"]]
+        for group in f.values():
+            if isinstance(group, h5py.Group):
+                datasets += [group["I"], group["E2"]]
+            continue
+        for dataset in datasets:
+            dataset.resize(n, axis=0)
+            continue
+        return
+
+    def _create(self, group, key, array):
+        # one round per chunk, in the shape and floating point type of the array
+        shape = array.shape
+        group.create_dataset(
+            key,
+            shape=(0,) + shape,
+            maxshape=(None,) + shape,
+            chunks=(1,) + shape,
+            dtype=array.dtype,
+            compression=self.compression,
+            shuffle=True,
+        )
+        return
+
+    def _append(self, dataset, n, value):
+        dataset.resize(n + 1, axis=0)
+        dataset[n] = value
+        return
+
+
+class AsyncRoundWriter:
+    """Run a round writer in a background thread
+
+    Rounds are handed over through a bounded queue, so the sqe2dos
+    iteration only blocks if the writer falls more than `maxsize`
+    rounds behind. The histograms are copied before they are queued,
+    since the iteration keeps modifying some of them.
+    An exception raised by the writer is re-raised in the calling thread
+    at the next call of write, flush or close.
+
+    Parameters
+    ----------
+    writer: FilesRoundWriter or HDF5RoundWriter
+        the writer to run in the background
+
+    maxsize: int
+        maximum number of rounds waiting to be written
+
+    """
+
+    _stop = object()
+
+    def __init__(self, writer, maxsize=2):
+        self.writer = writer
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name="sqe2dos-writer", daemon=True)
+        self._thread.start()
+        return
+
+    def write(self, roundno, sqes, dos, mask):
+        """Queue the intermediate results of one round. See FilesRoundWriter.write"""
+        self._raise()
+        sqes = [(name, sqe.copy()) for name, sqe in sqes]
+        self._queue.put((roundno, sqes, dos.copy(), mask.copy()))
+        return
+
+    def flush(self):
+        """Wait until all queued rounds are written"""
+        self._queue.join()
+        self._raise()
+        return
+
+    def close(self):
+        """Write all queued rounds, stop the thread and close the writer"""
+        if self._thread.is_alive():
+            self._queue.put(self._stop)
+            self._thread.join()
+        self.writer.close()
+        self._raise()
+        return
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is self._stop:
+                    return
+                # skip the remaining rounds after an error
+                if self._error is None:
+                    self.writer.write(*item)
+            except Exception:
+                self._error = sys.exc_info()[1]
+            finally:
+                self._queue.task_done()
+        return
+
+    def _raise(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise RuntimeError("Failed to write intermediate results of sqe2dos") from error
+        return
+
+
+def createRoundWriter(workdir, output_format="files", background=False, resume_after=None):
+    """Create a writer for the intermediate results of sqe2dos
+
+    Parameters
+    ----------
+    workdir: str
+        work directory
+
+    output_format: str
+        "files": round-N directories of histogram files. "hdf5": one consolidated HDF5 file
+
+    background: boolean
+        If True, write in a background thread. See AsyncRoundWriter
+
+    resume_after: int
+        If given, keep the rounds already saved up to this one. See HDF5RoundWriter
+
+    """
+    if output_format == "files":
+        writer = FilesRoundWriter(workdir)
+    elif output_format == "hdf5":
+        writer = HDF5RoundWriter(workdir, resume_after=resume_after)
+    else:
+        raise ValueError("Unknown intermediate output format: %s" % (output_format,))
+    if background:
+        writer = AsyncRoundWriter(writer)
+    return writer
+
+
+# readers of the consolidated file
+def list_rounds(path):
+    """Return the round numbers saved in a consolidated file"""
+    import h5py
+
+    with h5py.File(path, "r") as f:
+        return list(f["rounds"][:])
+
+
+def load_sqe(path, name, roundno=None):
+    """Load one S(Q,E) histogram of a round from a consolidated file
+
+    Parameters
+    ----------
+    path: str
+        path to the consolidated file
+
+    name: str
+        name of the S(Q,E), for example "exp-sqe" or "mp-sqe.h5"
+
+    roundno: int
+        round number. Default: the last saved round
+
+    """
+    import h5py
+    import histogram as H
+
+    if name.endswith(".h5"):
+        name = name[:-3]
+    with h5py.File(path, "r") as f:
+        index = _round_index(f, roundno)
+        Q, E = f["Q"][:], f["E"][:]
+        I, E2 = f[name]["I"][index], f[name]["E2"][index]
+    return H.histogram(name, [("Q", Q, "1./angstrom"), ("E", E, "meV")], data=I, errors=E2)
+
+
+def load_dos(path, roundno=None):
+    """Load the DOS of a round from a consolidated file. See load_sqe"""
+    import h5py
+    import histogram as H
+
+    with h5py.File(path, "r") as f:
+        index = _round_index(f, roundno)
+        E = f["dos"]["E"][:]
+        I, E2 = f["dos"]["I"][index], f["dos"]["E2"][index]
+    return H.histogram("DOS", [("E", E, "meV")], data=I, errors=E2)
+
+
+def _round_index(f, roundno):
+    rounds = list(f["rounds"][:])
+    if roundno is None:
+        return len(rounds) - 1
+    if roundno not in rounds:
+        raise KeyError("Round %s was not saved. Saved rounds: %s" % (roundno, rounds))
+    return rounds.index(roundno)
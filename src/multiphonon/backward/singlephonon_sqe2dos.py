@@ -10,7 +10,7 @@ class EnergyAxisMissingBinCenterAtZero(Exception):
     pass
 
 
-def sqe2dos(sqe, T, Ecutoff, elastic_E_cutoff, M, initdos=None, update_weights=None):
+def sqe2dos(sqe, T, Ecutoff, elastic_E_cutoff, M, initdos=None, update_weights=None, mixer=None, dtype="d"):
     """Given a single-phonon SQE, compute DOS
 
     The basic procedure is
@@ -43,6 +43,14 @@ def sqe2dos(sqe, T, Ecutoff, elastic_E_cutoff, M, initdos=None, update_weights=N
     update_weights:2-tuple of floats
         weights for DOS update strategies (continuity, area conservation)
 
+    mixer:callable
+        mixer(x, g) combines the initial DOS x and the updated DOS g in the
+        updated energy range, up to Ecutoff or the end of the energy axis of sqe.
+        See multiphonon.backward.mixing
+
+    dtype:numpy dtype
+        floating point type of the computed single-phonon SQE. The DOS is always double precision
+
     """
     # create initial guess of dos
     Efull = sqe.E
@@ -68,7 +76,7 @@ def sqe2dos(sqe, T, Ecutoff, elastic_E_cutoff, M, initdos=None, update_weights=N
     E = sqe.E
     dE = E[1] - E[0]
     beta = 1.0 / (T * kelvin2mev)
-    Q2, E2, sqeset = computeSQESet(1, Q, dQ, initdos.E, dE, M, initdos.I, beta)
+    Q2, E2, sqeset = computeSQESet(1, Q, dQ, initdos.E, dE, M, initdos.I, beta, dtype=dtype)
     # compute S(E) from SQE
     # - experiment
     # -- only need the positive part
@@ -107,7 +115,12 @@ def sqe2dos(sqe, T, Ecutoff, elastic_E_cutoff, M, initdos=None, update_weights=N
     Emax = min(Eplus[-1], Ecutoff)
     dos_to_update = dos_in_range[(Emin, min(Eplus[-1], Emax * 2))]
     # update
-    return update_dos(initdos, dos_to_update, Emin, Emax, weights=update_weights)
+    newdos = update_dos(initdos, dos_to_update, Emin, Emax, weights=update_weights)
+    if mixer is not None:
+        # mix the updated range of the stitched DOS, so that g - x is the fixed-point residual
+        updated = newdos[(Emin, Emax)]
+        updated.I[:] = mixer(initdos[(Emin, Emax)].I, updated.I)
+    return newdos
 
 
 def update_dos(original_dos_hist, new_dos_hist, Emin, Emax, weights=None):
@@ -3,16 +3,16 @@
 # Jiao Lin <jiao.lin@gmail.com>
 
 import os
+import time
 
 import histogram.hdf as hh
 import numpy as np
 
 from ._sqe2dos_script_templates import (
     plot_dos_iteration_code,
-    plot_intermediate_result_se_code,
-    plot_intermediate_result_sqe_code,
     plot_residual_code,
 )
+from .roundwriter import OutputPolicy, createRoundWriter
 from .singlephonon_sqe2dos import sqe2dos as singlephonon_sqe2dos
 
 
@@ -29,6 +29,16 @@ def sqe2dos(
     TOLERATION=1e-4,
     initdos=None,
     update_strategy_weights=None,
+    intermediate_output="all",
+    intermediate_output_format="files",
+    background_output=False,
+    checkpoint=False,
+    resume=False,
+    mixing=None,
+    records=False,
+    stop=None,
+    dtype="d",
+    phonon_order_tol=None,
 ):
     """Given a SQE, compute DOS
 
@@ -81,70 +91,194 @@ def sqe2dos(
     TOLERATION: float
         Toleration for convergence test
 
+    intermediate_output: str or int
+        Which rounds to save intermediate results for.
+        "all": every round. "none": no round. "final": only the last round.
+        integer k: every k-th round and the last round.
+
+    intermediate_output_format: str
+        "files": save each round in a round-N subdirectory of workdir.
+        "hdf5": append all rounds to one compressed HDF5 file, workdir/rounds.h5.
+
+    background_output: boolean
+        If True, intermediate results are written in a background thread,
+        and the iteration does not wait for them.
+
+    checkpoint: boolean
+        If True, save the state of the iteration to workdir/checkpoint.h5 after every round.
+        See multiphonon.backward.checkpoint
+
+    resume: boolean
+        If True, resume from workdir/checkpoint.h5 if it exists and its parameters
+        match this run. The DOS of the rounds already done are not yielded again,
+        and MAX_ITERATION counts them. If the checkpointed iteration had converged,
+        or MAX_ITERATION rounds are done, only the final steps are redone.
+        Implies checkpoint=True.
+
+    mixing: str or mixer
+        Update scheme of the iteration: None or "plain", "damping", "anderson",
+        or a mixer instance, for example multiphonon.backward.mixing.AndersonMixing(depth=3).
+        The residual norm of every round is recorded in the residual_norms list of the mixer.
+        The mixing history is not checkpointed. It starts over when resuming.
+
+    records: boolean
+        If True, yield (dos, record) at the end of every round instead of the DOS alone.
+        record is a multiphonon.backward.convergence.RoundRecord with the change of the DOS,
+        the residual S(E) norm and the wall time of the stages of the round.
+
+    stop: list of callables
+        Stopping rules checked after every round, in addition to the TOLERATION test.
+        For example [convergence.Stagnation(), convergence.TimeBudget(3600)].
+        See multiphonon.backward.convergence. The iteration stops when any rule gives a reason.
+        A run stopped by a rule other than TOLERATION continues when resumed.
+
+    dtype: numpy dtype
+        floating point type of the S(Q,E)s of the iteration. "f" (float32) halves their memory.
+        If it differs from that of the input sqe, the iteration works on a converted copy of sqe.
+        The DOS is always double precision
+
+    phonon_order_tol: float
+        If given, the order of the phonon expansion of the multiphonon SQE is chosen
+        in every round for this tolerance. See multiphonon.forward.dos2sqe.
+        The order is recorded in the phonon_order of the round records
+
     """
+    from ..forward.cache import fingerprint
+    from . import checkpoint as ckpt
+
+    checkpoint_path = os.path.join(workdir, ckpt.CHECKPOINT_FILENAME)
+    parameters = ckpt.parameters(
+        sqe,
+        T=T,
+        Ecutoff=Ecutoff,
+        elastic_E_cutoff=elastic_E_cutoff,
+        M=M,
+        C_ms=C_ms,
+        Ei=Ei,
+        TOLERATION=TOLERATION,
+        update_strategy_weights=update_strategy_weights,
+        initdos=None if initdos is None else fingerprint(initdos.E, initdos.I, initdos.E2),
+        dtype=np.dtype(dtype).str,
+        phonon_order_tol=phonon_order_tol,
+    )
+    if sqe.I.dtype != np.dtype(dtype):
+        from ..sqe import astype
+
+        sqe = astype(sqe, dtype)
     mask = sqe.I != sqe.I
     corrected_sqe = sqe
     prev_dos = initdos
     total_rounds = 0
-    for roundno in range(MAX_ITERATION):
-        # compute dos.
-        # corrected_sqe: the most recent corrected sqe histogram. same shape as input sqe
-        dos = singlephonon_sqe2dos(
-            corrected_sqe,
-            T,
-            Ecutoff,
-            elastic_E_cutoff,
-            M,
-            initdos=prev_dos,
-            update_weights=update_strategy_weights,
-        )
-        # dos only contains positive portion of the Eaxis of the corrected_sqe
-        yield dos
-        # compute expected sqe
-        from ..forward import dos2sqe
-
-        # all sqes are histograms and have the same axes of the input experimental sqe
-        # the tot_inel_sqe is masked by the input experimental sqe
-        singlephonon_sqe, mpsqe, mssqe, tot_inel_sqe = dos2sqe(dos, C_ms, sqe, T, M, Ei)
-        # scale exp sqe for comparision.
-        # after scale the total intensity of the E>elastic_E_cutoff[1] portion of the exp sqe
-        # matches that of the tot_inel_sqe
-        scale_expsqe_to_match_inel_se(sqe, tot_inel_sqe, elastic_E_cutoff[-1])
-        # compute SQE correction
-        sqe_correction = mpsqe + mssqe
-        # compute corrected SQE
-        corrected_sqe = sqe + sqe_correction * (-1.0, 0)
-        # compute residual
-        residual_sqe = corrected_sqe + singlephonon_sqe * (-1.0, 0)
-        # save intermediate results
-        cwd = os.path.join(workdir, "round-%d" % roundno)
-        if not os.path.exists(cwd):
-            os.makedirs(cwd)
-
-        def savesqe(sqe, fn):
-            sqe.I[mask] = np.nan
-            hh.dump(sqe, os.path.join(cwd, fn))
-            return
-
-        savesqe(sqe, "exp-sqe.h5")
-        savesqe(mpsqe, "mp-sqe.h5")
-        savesqe(mssqe, "ms-sqe.h5")
-        savesqe(sqe_correction, "sqe_correction.h5")
-        savesqe(corrected_sqe, "corrected_sqe.h5")
-        savesqe(singlephonon_sqe, "sp-sqe.h5")
-        savesqe(residual_sqe, "residual-sqe.h5")
-        savesqe(tot_inel_sqe, "total-inel-sqe.h5")
-        # save DOS
-        hh.dump(dos, os.path.join(cwd, "dos.h5"))
-        # write scripts
-        create_script(os.path.join(cwd, "plot_sqe.py"), plot_intermediate_result_sqe_code)
-        create_script(os.path.join(cwd, "plot_se.py"), plot_intermediate_result_se_code)
-        total_rounds += 1
-        if prev_dos:
-            if isclose(dos, prev_dos, TOLERATION):
+    first_round = 0
+    converged = False
+    saved = _resumable_checkpoint(checkpoint_path, sqe, parameters) if resume else None
+    if saved is not None:
+        # continue from the last complete round
+        sqe.I[:] = saved.sqe.I
+        sqe.E2[:] = saved.sqe.E2
+        corrected_sqe = saved.corrected_sqe
+        residual_sqe = saved.residual_sqe
+        dos = prev_dos = saved.dos
+        roundno = saved.roundno
+        first_round = total_rounds = roundno + 1
+        converged = saved.converged
+    checkpoint = checkpoint or resume
+    if checkpoint and not os.path.exists(workdir):
+        os.makedirs(workdir)
+    from .mixing import createMixer
+
+    mixer = createMixer(mixing)
+    from . import convergence
+
+    stop = list(stop or [])
+    history = []
+    start_time = time.perf_counter()
+    policy = OutputPolicy(intermediate_output)
+    writer = createRoundWriter(
+        workdir,
+        intermediate_output_format,
+        background=background_output,
+        resume_after=None if saved is None else saved.roundno,
+    )
+    last_written = None
+    try:
+        for roundno in range(first_round, first_round if converged else MAX_ITERATION):
+            record = convergence.RoundRecord(roundno)
+            stopwatch = convergence.Stopwatch(record.timings)
+            # compute dos.
+            # corrected_sqe: the most recent corrected sqe histogram. same shape as input sqe
+            dos = singlephonon_sqe2dos(
+                corrected_sqe,
+                T,
+                Ecutoff,
+                elastic_E_cutoff,
+                M,
+                initdos=prev_dos,
+                update_weights=update_strategy_weights,
+                mixer=mixer,
+                dtype=dtype,
+            )
+            # dos only contains positive portion of the Eaxis of the corrected_sqe
+            stopwatch.lap("singlephonon")
+            if not records:
+                yield dos
+                stopwatch = convergence.Stopwatch(record.timings)
+            # compute expected sqe
+            from ..forward import dos2sqe
+
+            # all sqes are histograms and have the same axes of the input experimental sqe
+            # the tot_inel_sqe is masked by the input experimental sqe
+            singlephonon_sqe, mpsqe, mssqe, tot_inel_sqe = dos2sqe(
+                dos, C_ms, sqe, T, M, Ei, dtype=dtype, tol=phonon_order_tol
+            )
+            stopwatch.lap("forward")
+            # scale exp sqe for comparision.
+            # after scale the total intensity of the E>elastic_E_cutoff[1] portion of the exp sqe
+            # matches that of the tot_inel_sqe
+            scale_expsqe_to_match_inel_se(sqe, tot_inel_sqe, elastic_E_cutoff[-1])
+            # compute SQE correction
+            sqe_correction = mpsqe + mssqe
+            # compute corrected SQE
+            corrected_sqe = sqe + sqe_correction * (-1.0, 0)
+            # compute residual
+            residual_sqe = corrected_sqe + singlephonon_sqe * (-1.0, 0)
+            stopwatch.lap("correction")
+            # save intermediate results
+            intermediates = _intermediates(
+                sqe, mpsqe, mssqe, sqe_correction, corrected_sqe, singlephonon_sqe, residual_sqe, tot_inel_sqe
+            )
+            if policy.should_write(roundno):
+                writer.write(roundno, intermediates, dos, mask)
+                last_written = roundno
+            total_rounds += 1
+            converged = bool(prev_dos) and isclose(dos, prev_dos, TOLERATION)
+            if checkpoint:
+                state = ckpt.Checkpoint(roundno, converged, parameters, sqe, corrected_sqe, residual_sqe, dos)
+                ckpt.save(checkpoint_path, state)
+            stopwatch.lap("output")
+            # convergence metrics and stopping rules
+            convergence.dosChange(record, dos, prev_dos)
+            record.residual_norm = convergence.residualNorm(residual_sqe, sqe, elastic_E_cutoff[-1])
+            record.mixing_residual = mixer.residual_norms[-1] if mixer.residual_norms else np.nan
+            record.phonon_order = mpsqe.getAttribute("phonon_order")
+            record.elapsed = time.perf_counter() - start_time
+            record.stop = "converged" if converged else None
+            for rule in stop:
+                record.stop = record.stop or rule(record, history)
+                continue
+            history.append(record)
+            if records:
+                yield dos, record
+            if record.stop:
                 break
-        prev_dos = dos
-        continue
+            prev_dos = dos
+            continue
+        if policy.write_final and last_written != roundno and total_rounds > first_round:
+            writer.write(roundno, intermediates, dos, mask)
+    finally:
+        # make sure all intermediate results are written,
+        # even if the caller stops the iteration early
+        writer.close()
 
     # in the end, add error of residual to the error bar
     # of the DOS
@@ -182,6 +316,37 @@ def sqe2dos(
     return
 
 
+def _resumable_checkpoint(path, sqe, parameters):
+    """Load the checkpoint at path if it exists and was saved with the same parameters"""
+    from . import checkpoint as ckpt
+
+    saved = ckpt.load(path, sqe)
+    if saved is None:
+        return
+    mismatches = ckpt.mismatches(saved.parameters, parameters)
+    if mismatches:
+        import warnings
+
+        warnings.warn(
+            "Not resuming from %s: parameters %s differ from this run. Starting over" % (path, ", ".join(mismatches))
+        )
+        return
+    return saved
+
+
+def _intermediates(sqe, mpsqe, mssqe, sqe_correction, corrected_sqe, singlephonon_sqe, residual_sqe, tot_inel_sqe):
+    return [
+        ("exp-sqe", sqe),
+        ("mp-sqe", mpsqe),
+        ("ms-sqe", mssqe),
+        ("sqe_correction", sqe_correction),
+        ("corrected_sqe", corrected_sqe),
+        ("sp-sqe", singlephonon_sqe),
+        ("residual-sqe", residual_sqe),
+        ("total-inel-sqe", tot_inel_sqe),
+    ]
+
+
 def computeDirtyDOS(sqe, dos, M, T, workdir):
     """Dirty dos calculation is procedure that quickly
     "correct" sqe using the one-phonon Q multiplier.
@@ -191,7 +356,7 @@ def computeDirtyDOS(sqe, dos, M, T, workdir):
     """
     if not os.path.exists(workdir):
         os.makedirs(workdir)
-    from ..forward.phonon import DWExp, computeSNQ, gamma0, kelvin2mev
+    from ..forward.phonon import DWExp, computeSNQ, gamma0, kelvin2mev, thermalTable
 
     beta = 1.0 / (T * kelvin2mev)
     dos1 = dos[(None, sqe.E[-1])]
@@ -213,7 +378,7 @@ def computeDirtyDOS(sqe, dos, M, T, workdir):
     assert np.allclose(se1.E, dos1.E)
     #
     g0 = gamma0(E, g, beta, dE)
-    fE = (1 - np.exp(-se1.E * beta)) * se1.E * g0
+    fE = thermalTable(se1.E, beta).E_over_occupation * g0
     ddos = se1.copy()
     ddos.I *= fE
     ddos.E2 *= fE * fE
@@ -5,12 +5,28 @@
 
 import numpy as np
 
+from .cache import forward_cache
 
-def dos2sqe(dos, C_ms, sqe, T, M, Ei):
+
+def cache_stats():
+    """Return hit/miss statistics of the forward-model cache"""
+    return forward_cache.stats()
+
+
+def clear_cache():
+    """Clear the forward-model cache and reset its statistics"""
+    forward_cache.clear()
+    return
+
+
+def dos2sqe(dos, C_ms, sqe, T, M, Ei, dtype="d", blocksize=128, N=4, tol=None):
     """Calculate SQE from DOS.
 
     The computed SQE has similar props as the given (experimental) SQE.
 
+    Returns (singlephonon_sqe, mpsqe, mssqe, tot_inel_sqe).
+    The order of the phonon expansion used is their attribute "phonon_order".
+
     Parameters
     ----------
     dos: histogram
@@ -31,6 +47,21 @@ def dos2sqe(dos, C_ms, sqe, T, M, Ei):
     Ei: float
         Incident energy (meV)
 
+    dtype: numpy dtype
+        floating point type of the computed SQEs.
+        "f" (float32) halves their memory. See multiphonon.forward.phonon.computeSQETerms
+
+    blocksize: int
+        number of Q points computed at a time. The SQEs are computed only
+        in the energy range of the given sqe, one block of Q at a time
+
+    N: int
+        order of the phonon expansion
+
+    tol: float
+        tolerance for the adaptive order. N is then chosen by
+        multiphonon.forward.phonon.truncationOrder
+
     """
     Q, E = sqe.Q, sqe.E
     dQ = Q[1] - Q[0]
@@ -41,38 +72,50 @@ def dos2sqe(dos, C_ms, sqe, T, M, Ei):
     Elast = E[-1]
     mask = sqe.I != sqe.I
 
+    import histogram as H
+
+    from .. import ms
+    from ..sqe import dynamical_range_mask
     from . import phonon
 
-    # compute one phonon SQE
-    singlephonon_sqe = phonon.sqehist(
-        dos.E,
-        dos.I,
-        starting_order=1,
-        N=1,
-        T=T,
-        M=M,
-        Qmin=Qmin,
-        Qmax=Qmax,
-        dQ=dQ,
-    )[(), (Efirst, Elast)].rename("SP SQE")
-    # compute MP sqe
-    mpsqe = phonon.sqehist(
+    # compute one phonon and MP sqe from the same intermediates
+    Q2, E2, SnQ_set, AnE_set = phonon.sqe_terms(
         dos.E,
         dos.I,
-        starting_order=2,
-        N=4,
+        N=N,
         T=T,
         M=M,
         Qmin=Qmin,
         Qmax=Qmax,
         dQ=dQ,
-    )[(), (Efirst, Elast)].rename("MP SQE")
-    # compute MS sqe
-    from .. import ms
+        dtype=dtype,
+        tol=tol,
+    )
+    # only the energy range of the given sqe
+    first, last = np.abs(E2 - Efirst).argmin(), np.abs(E2 - Elast).argmin()
+    AnE_set = AnE_set[:, first : last + 1]
+    Qaxis = H.axis("Q", Q2, "1./angstrom")
+    Eaxis = H.axis("E", E2[first : last + 1], "meV")
+    shape = Q2.size, AnE_set.shape[1]
+    singlephonon_sqe = H.histogram("SP SQE", [Qaxis, Eaxis], data=np.zeros(shape, AnE_set.dtype))
+    mpsqe = H.histogram("MP SQE", [Qaxis, Eaxis], data=np.zeros(shape, AnE_set.dtype))
 
-    mssqe = ms.sqe(mpsqe, Ei)
+    # fill in the SP and MP sqe block by block of Q
+    mpblocks = []
+    for rows in phonon.Qblocks(Q2.size, blocksize):
+        singlephonon_sqe.I[rows] = phonon.sumSQESet(SnQ_set[:1, rows], AnE_set[:1])
+        mpsqe.I[rows] = phonon.sumSQESet(SnQ_set[:, rows], AnE_set, starting_order=2)
+        mpblocks.append((rows, mpsqe.I[rows]))
+        continue
+    # compute MS sqe from the average of the MP blocks over Q
+    msmask = dynamical_range_mask(mpsqe, Ei)
+    mssqe = ms.sqe_from_average(mpsqe, ms.average_over_Q(mpblocks, msmask), msmask)
     mssqe.I[:] *= C_ms
     # total expected inelastic sqe computed from trial DOS
     tot_inel_sqe = singlephonon_sqe + mpsqe + mssqe
     tot_inel_sqe.I[mask] = np.nan
-    return singlephonon_sqe, mpsqe, mssqe, tot_inel_sqe
+    sqes = singlephonon_sqe, mpsqe, mssqe, tot_inel_sqe
+    for h in sqes:
+        h.setAttribute("phonon_order", len(SnQ_set))
+        continue
+    return sqes
@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+#
+
+
+"""memoization of forward-model intermediates
+
+The forward model is evaluated many times on the same axes,
+for example in every round of backward.sqe2dos.sqe2dos and in
+parameter scans over the same sample. Its intermediates are cached
+in a bounded least-recently-used cache keyed on the content hash of
+the arrays they depend on, and on a few scalars:
+
+- the thermal factors and the reflected energy axis depend on the
+  energy axis and T only, and the recoil energies on the Q axis and M.
+  They are reused in every round of sqe2dos;
+- A_n(E) and S_n(Q) also depend on the DOS. They are reused only when
+  the same DOS is evaluated again, for example for several datasets
+  of multiEi_sqe2dos, or in repeated runs.
+
+Cached arrays are read-only. Callers must copy them before modifying them.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+class LRUCache:
+    """A bounded least-recently-used cache with hit/miss statistics
+
+    Parameters
+    ----------
+    maxsize:integer
+        maximum number of entries. 0 disables caching
+
+    """
+
+    def __init__(self, maxsize=32):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.RLock()
+        # key -> _Pending, for the values being computed
+        self._pending = {}
+        self.hits = self.misses = 0
+        return
+
+    def get(self, key, compute):
+        """Return the value for `key`. Call `compute()` to obtain it if missing
+
+        Threads asking for a key that another thread is computing wait for
+        that computation instead of repeating it.
+        """
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            pending = self._pending.get(key)
+            if pending is None:
+                self.misses += 1
+                pending = self._pending[key] = _Pending()
+                owner = True
+            else:
+                owner = False
+        if not owner:
+            pending.done.wait()
+            if pending.failed:
+                # the other computation raised. try again
+                return self.get(key, compute)
+            with self._lock:
+                self.hits += 1
+            return pending.value
+        try:
+            value = compute()
+            _freeze(value)
+            pending.value = value
+            with self._lock:
+                if self.maxsize > 0:
+                    self._data[key] = value
+                    self._data.move_to_end(key)
+                    self._evict()
+        except BaseException:
+            pending.failed = True
+            raise
+        finally:
+            with self._lock:
+                del self._pending[key]
+            pending.done.set()
+        return value
+
+    def resize(self, maxsize):
+        with self._lock:
+            self.maxsize = maxsize
+            self._evict()
+        return
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = 0
+        return
+
+    def stats(self):
+        """Return a dictionary of hits, misses, current size, and maximum size"""
+        with self._lock:
+            return dict(hits=self.hits, misses=self.misses, size=len(self._data), maxsize=self.maxsize)
+
+    def __len__(self):
+        """Number of cached entries"""
+        return len(self._data)
+
+    def _evict(self):
+        while len(self._data) > max(self.maxsize, 0):
+            self._data.popitem(last=False)
+        return
+
+
+class _Pending:
+    """A value being computed by one thread"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.failed = False
+        return
+
+
+def fingerprint(*arrays):
+    """Compute a content hash of the given numpy arrays"""
+    h = hashlib.sha1()
+    for a in arrays:
+        a = np.ascontiguousarray(a)
+        h.update(str((a.dtype.str, a.shape)).encode())
+        h.update(a.tobytes())
+        continue
+    return h.hexdigest()
+
+
+def _freeze(value):
+    if isinstance(value, np.ndarray):
+        value.flags.writeable = False
+    elif isinstance(value, tuple):
+        for v in value:
+            _freeze(v)
+    return
+
+
+# the cache used by the forward model
+forward_cache = LRUCache(maxsize=32)
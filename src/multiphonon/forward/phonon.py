@@ -14,11 +14,11 @@ Some of the implementation here were taken from
 Max Kresch's original multiphonon code.
 """
 
-import math
-import warnings
-
 import numpy as np
 
+# maximum order of the phonon expansion chosen by truncationOrder
+MAX_ORDER = 100
+
 
 def sqehist(E, g, **kwds):
     """A simple wrapper of method sqe to return a histogram
@@ -43,6 +43,37 @@ def sqehist(E, g, **kwds):
     return H.histogram("SP SQE", [Qaxis, Eaxis], S)
 
 
+def sqehists(E, g, **kwds):
+    """Compute single-phonon and multiphonon S(Q,E) histograms in one pass
+
+    Both histograms are computed from the same set of intermediates
+    (expanded energy axis, normalized DOS, gamma0, A_n(E) and S_n(Q)).
+    Please see method sqe_terms for details of all keyword parameters.
+
+    Returns (sp, mp, terms). sp is the single-phonon S(Q,E), mp is the
+    sum of S_n(Q,E) for n in [2,N], and terms is the tuple (Q, E, SnQ_set, AnE_set)
+    of sqe_terms, from which each order can be obtained as
+    S_n(Q,E) = np.outer(SnQ_set[n-1], AnE_set[n-1]).
+
+    Parameters
+    ----------
+    E:numpy array of floats
+        energies in meV
+
+    g:numpy array of floats
+        density of states at the specified energies
+
+    """
+    terms = Q, E, SnQ_set, AnE_set = sqe_terms(E, g, **kwds)
+    import histogram as H
+
+    Qaxis = H.axis("Q", Q, "1./angstrom")
+    Eaxis = H.axis("E", E, "meV")
+    sp = H.histogram("SP SQE", [Qaxis, Eaxis], sumSQESet(SnQ_set[:1], AnE_set[:1]))
+    mp = H.histogram("MP SQE", [Qaxis, Eaxis], sumSQESet(SnQ_set, AnE_set, starting_order=2))
+    return sp, mp, terms
+
+
 def sqe(
     E,
     g,
@@ -54,6 +85,9 @@ def sqe(
     N=5,
     starting_order=2,
     Emax=None,
+    method="fft",
+    dtype="d",
+    tol=None,
 ):
     r"""Compute sum of multiphonon SQE from dos
 
@@ -61,6 +95,9 @@ def sqe(
 
     Note: single phonon scattering is not included. only 2-phonons and up
 
+    If tol is given, the order N is chosen by truncationOrder.
+    sqe_order gives the order chosen.
+
     Parameters
     ----------
     E:numpy array of floats
@@ -90,7 +127,173 @@ def sqe(
     starting_order:integer
         starting number for phonon scattering order
 
+    method:str
+        method to compute A_n(E). See computeAnESet
+
+    dtype:numpy dtype
+        floating point type of A_n(E), S_n(Q) and the result. See computeSQETerms
+
+    tol:float
+        tolerance for the adaptive order. Orders are added while the
+        maximum of S_n(Q) over the Q axis is at least tol. N is then ignored
+
+    """
+    Q, E, SnQ_set, AnE_set = sqe_terms(
+        E, g, Qmax=Qmax, Qmin=Qmin, dQ=dQ, T=T, M=M, N=N, Emax=Emax, method=method, dtype=dtype, tol=tol
+    )
+    return Q, E, sumSQESet(SnQ_set, AnE_set, starting_order)
+
+
+def sqe_terms(
+    E,
+    g,
+    Qmax=None,
+    Qmin=0,
+    dQ=None,
+    T=300,
+    M=50,
+    N=5,
+    Emax=None,
+    method="fft",
+    dtype="d",
+    tol=None,
+):
+    """Compute the terms S_n(Q) and A_n(E) of the phonon expansion from dos
+
+      S_n(Q,E) = S_n(Q) A_n(E), for n in [1,N]
+
+    The energy axis is expanded and the DOS normalized the same way as in sqe.
+    Please see method sqe for details of the parameters.
+    SnQ_set and AnE_set are read-only. See computeSQETerms.
+    If tol is given, N is chosen by truncationOrder, and is len(SnQ_set).
+
+    Returns (Q, E, SnQ_set, AnE_set)
+    """
+    Q, E, g, de = _prepare_axes(E, g, Qmax, Qmin, dQ, Emax)
+    # beta
+    beta = 1.0 / (T * kelvin2mev)
+    if tol is not None:
+        N = truncationOrder(DWExp(Q, M, E, g, beta, de), tol)
+
+    # compute S_n(Q) and A_n(E)
+    E, SnQ_set, AnE_set = computeSQETerms(N, Q, E, de, M, g, beta, method=method, dtype=dtype)
+    return Q, E.copy(), SnQ_set, AnE_set
+
+
+def sqe_order(E, g, tol, Qmax=None, Qmin=0, dQ=None, T=300, M=50, Emax=None):
+    """Return the order of the phonon expansion chosen by sqe for a tolerance
+
+    Please see method sqe for details of the parameters, and truncationOrder for the choice.
+    """
+    Q, E, g, de = _prepare_axes(E, g, Qmax, Qmin, dQ, Emax)
+    beta = 1.0 / (T * kelvin2mev)
+    return truncationOrder(DWExp(Q, M, E, g, beta, de), tol)
+
+
+def sqe_blocks(E, g, blocksize=128, starting_order=2, **kwds):
+    r"""Compute sum of multiphonon SQE from dos, in blocks of Q
+
+      S = \sum_{i=starting_order,N} S_i(Q,E)
+
+    This is the generator version of sqe. S_n(Q) and A_n(E) are computed
+    once, and each block of rows is a product of a slice of S_n(Q) and A_n(E),
+    so the whole (nQ, nE) array is never created.
+    Please see method sqe for details of the other keyword parameters.
+
+    Yields (Q, E, S) for consecutive blocks of Q. S has shape (len(Q), nE)
+
+    Parameters
+    ----------
+    E:numpy array of floats
+        energies in meV
+
+    g:numpy array of floats
+        density of states at the given energies
+
+    blocksize:integer
+        number of Q points per block
+
+    starting_order:integer
+        starting number for phonon scattering order
+
+    """
+    Q, E, SnQ_set, AnE_set = sqe_terms(E, g, **kwds)
+    for rows in Qblocks(Q.size, blocksize):
+        yield Q[rows], E, sumSQESet(SnQ_set[:, rows], AnE_set, starting_order)
+        continue
+    return
+
+
+def Qblocks(nQ, blocksize):
+    """Iterate over slices of consecutive rows of a Q axis of size nQ"""
+    for start in range(0, nQ, blocksize):
+        yield slice(start, min(start + blocksize, nQ))
+        continue
+    return
+
+
+def sqe_multiT(
+    E,
+    g,
+    T,
+    Qmax=None,
+    Qmin=0,
+    dQ=None,
+    M=50,
+    N=5,
+    starting_order=2,
+    Emax=None,
+    method="fft",
+):
+    r"""Compute sum of multiphonon SQE from dos at a series of temperatures
+
+      S_T = \sum_{i=starting_order,N} S_i(Q,E;T)
+
+    This is the same as calling sqe for every temperature, but the
+    temperature-independent parts (expanded and reflected energy axes,
+    normalized DOS, recoil energy) are computed only once, and the
+    temperature-dependent parts (gamma0, A_n(E), S_n(Q)) are computed
+    for all temperatures at once along a leading axis.
+    Please see method sqe for details of the other parameters.
+
+    Returns (Q, E, S). S has shape (nT, nQ, nE)
+
+    Parameters
+    ----------
+    E:numpy array of floats
+        energies in meV
+
+    g:numpy array of floats
+        density of states at the given energies
+
+    T:numpy array of floats
+        temperatures (Kelvin)
+
     """
+    Q, E, g, de = _prepare_axes(E, g, Qmax, Qmin, dQ, Emax)
+    # temperatures along the leading axis
+    betas = 1.0 / (np.asarray(T, dtype=float).reshape(-1, 1) * kelvin2mev)
+    g0 = gamma0(E, g, betas, de)
+    if method == "fft":
+        E2, AnE_set = computeAnESet(N, E, g, betas, de, method=method, g0=g0[:, np.newaxis])
+        AnE_set = AnE_set.transpose(1, 0, 2)
+    else:
+        # the other methods handle one temperature at a time
+        AnE_set = []
+        for beta, g0_T in zip(betas[:, 0], g0):
+            E2, AnE_T = computeAnESet(N, E, g, beta, de, method=method, g0=g0_T)
+            AnE_set.append(AnE_T)
+            continue
+        AnE_set = np.array(AnE_set)
+    DW2 = np.outer(g0, recoilE(Q, M))
+    SnQ_set = computeSnQSet(N, DW2).transpose(1, 0, 2)
+    start = starting_order - 1
+    S = np.matmul(SnQ_set[:, start:].transpose(0, 2, 1), AnE_set[:, start:])
+    return Q, E2, S
+
+
+def _prepare_axes(E, g, Qmax, Qmin, dQ, Emax):
+    """Expand the energy axis, normalize the DOS and create the Q axis. See sqe"""
     dos_sample = len(E)
     e0 = E[0]
     de = E[1] - E[0]
@@ -110,27 +313,10 @@ def sqe(
     if dQ is None:
         dQ = (Qmax - Qmin) / 200
     Q = np.arange(Qmin, Qmax, dQ)
+    return Q, E, g, de
 
-    # beta
-    beta = 1.0 / (T * kelvin2mev)
-
-    # compute S
-    S = None
-    for i, (Q, E, S1) in enumerate(iterSQESet(N, Q, dQ, E, de, M, g, beta)):
-        if i < starting_order - 1:
-            continue
-        if S is None:
-            S = S1
-            continue
-        S += S1
-        continue
 
-    # sum over 2..N
-    # S = S_set[starting_order-1:].sum(axis=0)
-    return Q, E, S
-
-
-def iterSQESet(N, Q, dQ, E, dE, M, g, beta):
+def iterSQESet(N, Q, dQ, E, dE, M, g, beta, method="fft"):
     """Iterate over the set of S(Q,E) for n in [1,N]
 
     Parameters
@@ -159,11 +345,11 @@ def iterSQESet(N, Q, dQ, E, dE, M, g, beta):
     beta:float
         1/(kBT)
 
-    """
-    E2, AnE_set = computeAnESet(N, E, g, beta, dE)
+    method:str
+        method to compute A_n(E). See computeAnESet
 
-    DW2 = DWExp(Q, M, E, g, beta, dE)
-    SnQ_set = computeSnQSet(N, DW2)
+    """
+    E2, SnQ_set, AnE_set = computeSQETerms(N, Q, E, dE, M, g, beta, method=method)
 
     sqe = []
     for S, A in zip(SnQ_set, AnE_set):
@@ -172,7 +358,71 @@ def iterSQESet(N, Q, dQ, E, dE, M, g, beta):
     return
 
 
-def computeSQESet(N, Q, dQ, E, dE, M, g, beta):
+def computeSQETerms(N, Q, E, dE, M, g, beta, method="fft", dtype="d"):
+    """Compute the sets of S_n(Q) and A_n(E) for n in [1,N]
+
+    gamma0 is computed only once and shared by A_1(E) and
+    the Debye-Waller exponent. The results are memoized in
+    multiphonon.forward.cache.forward_cache, and the returned arrays
+    are read-only. A_n(E) and S_n(Q) are keyed on the content of the DOS,
+    so they are reused only for the same DOS. The thermal factors and the
+    recoil energies they are computed from do not depend on the DOS and
+    are reused across the rounds of sqe2dos. See thermalTable and DWExp.
+
+    Returns (E2, SnQ_set, AnE_set), where E2 is the reflected energy axis.
+
+    Parameters
+    ----------
+    N:integer
+         number of iterations
+
+    Q:float
+        momentum transfer axis
+
+    E: float
+        energy transfer axis
+
+    dE:float
+        step size for energy transfer axis
+
+    M:float
+        atomic  mass
+
+    g:float
+        phonon DOS for the given E
+
+    beta:float
+        1/(kBT)
+
+    method:str
+        method to compute A_n(E). See computeAnESet
+
+    dtype:numpy dtype
+        floating point type of S_n(Q) and A_n(E). gamma0, A_1(E) and the
+        Debye-Waller exponent are always computed in double precision.
+        "f" (float32) halves the memory of the S(Q,E) computed from the terms
+
+    """
+    from .cache import fingerprint, forward_cache
+
+    dtype = np.dtype(dtype)
+
+    def _AnE():
+        g0 = gamma0(E, g, beta, dE)
+        return (g0,) + computeAnESet(N, E, g, beta, dE, method=method, g0=g0, dtype=dtype)
+
+    # A_n(E) depends on the DOS and the temperature
+    g0, E2, AnE_set = forward_cache.get(("AnE", fingerprint(E, g), beta, dE, N, method, dtype.str), _AnE)
+
+    def _SnQ():
+        DW2 = DWExp(Q, M, E, g, beta, dE, g0=g0)
+        return computeSnQSet(N, DW2).astype(dtype, copy=False)
+
+    SnQ_set = forward_cache.get(("SnQ", fingerprint(Q), M, g0, N, dtype.str), _SnQ)
+    return E2, SnQ_set, AnE_set
+
+
+def computeSQESet(N, Q, dQ, E, dE, M, g, beta, method="fft", summed=False, starting_order=1, dtype="d"):
     """Compute the set of S(Q,E) for n in [1,N]
 
     Parameters
@@ -201,12 +451,25 @@ def computeSQESet(N, Q, dQ, E, dE, M, g, beta):
     beta:float
         1/(kBT)
 
-    """
-    E2, AnE_set = computeAnESet(N, E, g, beta, dE)
+    method:str
+        method to compute A_n(E). See computeAnESet
 
-    DW2 = DWExp(Q, M, E, g, beta, dE)
-    SnQ_set = computeSnQSet(N, DW2)
+    summed:boolean
+        If True, return the sum of S_n(Q,E) for n in [starting_order, N]
+        as one (nQ, nE) array instead of the (N, nQ, nE) set.
+        See sumSQESet
+
+    starting_order:integer
+        starting order of the sum. Only used if summed is True
+
+    dtype:numpy dtype
+        floating point type of the result. See computeSQETerms
+
+    """
+    E2, SnQ_set, AnE_set = computeSQETerms(N, Q, E, dE, M, g, beta, method=method, dtype=dtype)
 
+    if summed:
+        return Q, E2, sumSQESet(SnQ_set, AnE_set, starting_order)
     sqe = []
     for S, A in zip(SnQ_set, AnE_set):
         sqe.append(np.outer(S, A))
@@ -215,9 +478,40 @@ def computeSQESet(N, Q, dQ, E, dE, M, g, beta):
     return Q, E2, sqe
 
 
+def sumSQESet(SnQ_set, AnE_set, starting_order=1):
+    """Compute the sum of S_n(Q,E) = S_n(Q) A_n(E) over n in [starting_order, N]
+
+    S(Q,E) is separable for each order, so the sum is a single
+    matrix product and the (N, nQ, nE) set is never created.
+
+    Parameters
+    ----------
+    SnQ_set:numpy array
+        S_n(Q) for n in [1,N]. shape (N, nQ)
+
+    AnE_set:numpy array
+        A_n(E) for n in [1,N]. shape (N, nE)
+
+    starting_order:integer
+        starting order of the sum
+
+    """
+    start = starting_order - 1
+    return np.dot(SnQ_set[start:].T, AnE_set[start:])
+
+
 def computeSnQSet(N, DW2):
     """Compute the set of Sn(Q) for n in [1,N]
 
+    All orders are evaluated at once in log space,
+
+      log S_n(Q) = n log(2W) - 2W - log(n!)
+
+    so that large orders and large Debye-Waller exponents neither
+    overflow nor underflow before the result does.
+
+    Returns an array of shape (N,) + DW2.shape
+
     Parameters
     ----------
     N:integer
@@ -227,10 +521,15 @@ def computeSnQSet(N, DW2):
         Debye Waller factor
 
     """
-    SNQ = []
-    for i in range(1, N + 1):
-        SNQ.append(computeSNQ(DW2, i))
-    return np.array(SNQ)
+    from scipy.special import gammaln, xlogy
+
+    DW2 = np.asarray(DW2, dtype=float)
+    n = np.arange(1, N + 1, dtype=float).reshape((N,) + (1,) * DW2.ndim)
+    # n log(0) = -inf gives S_n = 0 at Q=0
+    logS = xlogy(n, DW2)
+    logS -= DW2
+    logS -= gammaln(n + 1)
+    return np.exp(logS, out=logS)
 
 
 def computeSNQ(DW2, N):
@@ -238,6 +537,8 @@ def computeSNQ(DW2, N):
     integer N indicating a term in the phonon expansion and returns the
     intensity of the N-phonon incoherent scattering S_N(Q)
 
+    See computeSnQSet
+
     Parameters
     ----------
     N:integer
@@ -247,10 +548,53 @@ def computeSNQ(DW2, N):
         Debye Waller factor
 
     """
-    return DW2**N * np.exp(-DW2) / float(math.factorial(N))
+    from scipy.special import gammaln, xlogy
+
+    DW2 = np.asarray(DW2, dtype=float)
+    # xlogy(0, 0) = 0 gives S_0 = 1 at Q=0
+    return np.exp(xlogy(N, DW2) - DW2 - gammaln(N + 1))
+
+
+def truncationOrder(DW2, tol, maxorder=MAX_ORDER):
+    """Choose the order N of the phonon expansion for a tolerance
+
+    Returns the last order n for which the largest S_n(Q) over the Q axis
+    is at least tol, so all higher orders contribute less than tol.
+    The result is at least 1 and at most maxorder. If the orders beyond
+    maxorder are not negligible, a warning is issued and maxorder is returned.
+    S_n(Q) is a Poisson distribution over n with mean 2W, so
+    the order needed grows with 2W at the largest Q, i.e. with T, Qmax and 1/M.
+
+    Parameters
+    ----------
+    DW2: numpy array
+        Debye Waller exponent 2W on the Q axis
 
+    tol:float
+        tolerance for S_n(Q)
 
-def computeAnESet(N, E, g, beta, dE):
+    maxorder:integer
+        maximum order
+
+    """
+    DW2 = np.ravel(DW2)
+    # S_n(Q) is cheap. A_n(E) of the orders is what costs
+    Smax = computeSnQSet(maxorder, DW2).max(axis=1)
+    if DW2.max() >= maxorder or Smax[-1] >= tol:
+        import warnings
+
+        warnings.warn(
+            "Phonon expansion truncated at the maximum order %s: 2W is up to %.3g, and S_%s(Q) up to %.3g > tol=%s"
+            % (maxorder, DW2.max(), maxorder, Smax[-1], tol)
+        )
+        return maxorder
+    above = np.nonzero(Smax >= tol)[0]
+    if not above.size:
+        return 1
+    return int(above[-1]) + 1
+
+
+def computeAnESet(N, E, g, beta, dE, method="fft", g0=None, dtype="d"):
     """Compute the set of An(E) for n in [1,N]
 
     Parameters
@@ -270,18 +614,76 @@ def computeAnESet(N, E, g, beta, dE):
     beta:float
         1/(kBT)
 
+    method:str
+        how A_n is convolved from A_1 and A_{n-1}.
+        "fft": FFT-based convolution. O(N log N) time and O(N) memory.
+        "matrix": the original dense convolution matrix. O(N^2) time and memory.
+        "spectral": compute all orders at once from powers of the Fourier
+        transform of A_1. Unlike the other two methods, the intermediate
+        A_{n-1} is not truncated to the energy axis before the convolution,
+        so the results differ slightly where A_n extends beyond the axis.
+
+    g0:float
+        gamma0. computed from g if not given
+
+    dtype:numpy dtype
+        floating point type of the convolutions and the result.
+        A_1(E) is computed in double precision and then converted
+
     """
-    E, A1E = computeA1E(E, g, beta, dE)
+    E, A1E = computeA1E(E, g, beta, dE, g0=g0)
+    A1E = A1E.astype(dtype, copy=False)
+    if method == "spectral":
+        return E, computeAnESet_spectral(N, A1E, dE)
     ANE = np.zeros((N,) + A1E.shape, dtype=A1E.dtype)
     ANE[0] = A1E
 
     for i in range(2, N + 1):
-        ANE[i - 1] = AnE_from_n_1(ANE[0], ANE[i - 2], dE)
+        ANE[i - 1] = AnE_from_n_1(ANE[0], ANE[i - 2], dE, method=method)
         continue
     return E, ANE
 
 
-def AnE_from_n_1(A1E, Anm1E, dE):
+def computeAnESet_spectral(N, A1E, dE):
+    """Compute the set of An(E) for n in [1,N] in one spectral pass
+
+    A_1(E) is Fourier transformed once, and A_n(E) is obtained from the
+    n-th power of the transform. Each A_n is then cropped to the energy axis
+    and normalized, the same way as in AnE_from_n_1.
+
+    Parameters
+    ----------
+    N:integer
+        number of iterations
+
+    A1E:float
+        A_1(E) on an energy axis symmetric around 0
+
+    dE:float
+        step size for energy transfer axis
+
+    """
+    from scipy.fft import next_fast_len
+
+    L = len(A1E)
+    half = L // 2
+    # A_n is 2*n*half+1 long and we only keep the central L points.
+    # circular wrap-around does not reach those points if nfft > (n+1)*half
+    nfft = next_fast_len((N + 1) * half + 1, real=True)
+    # normalize before taking powers to keep the numbers in range
+    F = np.fft.rfft(A1E / A1E.sum(), nfft)
+    powers = np.cumprod(np.broadcast_to(F, (N, F.size)), axis=0)
+    An_full = np.fft.irfft(powers, nfft)
+    # the center of A_n is at index n*half
+    orders = np.arange(1, N + 1)
+    indexes = (orders * half)[:, np.newaxis] + np.arange(-half, L - half)[np.newaxis, :]
+    ANE = np.take_along_axis(An_full, indexes, axis=1).astype(A1E.dtype, copy=False)
+    ANE[1:] /= ANE[1:].sum(axis=1)[:, np.newaxis] * dE
+    ANE[0] = A1E
+    return ANE
+
+
+def AnE_from_n_1(A1E, Anm1E, dE, method="fft"):
     """Compute A_n(E) from A_{n-1}(E)
 
     A_n(E) = A1 (convolve) A_{n-1}
@@ -297,23 +699,59 @@ def AnE_from_n_1(A1E, Anm1E, dE):
     dE:float
         step size for energy transfer axis
 
+    method:str
+        "fft" or "matrix". See computeAnESet.
+        "fft" also accepts stacks of A_1 and A_{n-1}, convolved along the last axis
+
     """
-    Y = np.zeros(4 * len(Anm1E), "d")
-    Y[len(A1E) : 2 * len(A1E)] = Anm1E
-    y = np.zeros(3 * len(A1E), "d")
-    y = np.concatenate((y, A1E), axis=0)
-    y = y[::-1]
-    M = convMatrix(y)  # XXX: this could be big
-    res = np.inner(M, Y)
-    del M
-    res *= dE
-    start = len(A1E) // 2 + 1
-    t = res[start : start + len(A1E)]
+    if method == "fft":
+        t = fftconvolve(A1E, Anm1E)
+        # keep the central part. same as the "matrix" method
+        L = A1E.shape[-1]
+        start = L // 2
+        t = t[..., start : start + L] * dE
+    elif method == "matrix":
+        Y = np.zeros(4 * len(Anm1E), Anm1E.dtype)
+        Y[len(A1E) : 2 * len(A1E)] = Anm1E
+        y = np.zeros(3 * len(A1E), A1E.dtype)
+        y = np.concatenate((y, A1E), axis=0)
+        y = y[::-1]
+        M = convMatrix(y)  # XXX: this could be big
+        res = np.inner(M, Y)
+        del M
+        res *= dE
+        start = len(A1E) // 2 + 1
+        t = res[start : start + len(A1E)]
+    else:
+        raise ValueError("Unknown convolution method: %s" % (method,))
     # XXX: normalize?
-    t /= t.sum() * dE
+    t /= t.sum(axis=-1, keepdims=True) * dE
     return t
 
 
+def fftconvolve(a, b):
+    """Compute the full linear convolution of vectors a and b using FFT
+
+    The result has len(a)+len(b)-1 elements, same as np.convolve(a, b).
+    Stacks of vectors are convolved along the last axis.
+
+    Parameters
+    ----------
+    a:float
+        a vector
+
+    b:float
+        a vector
+
+    """
+    n = a.shape[-1] + b.shape[-1] - 1
+    # pad to a power of 2 to avoid circular wrap-around and to keep FFT fast
+    nfft = 1 << (n - 1).bit_length()
+    res = np.fft.irfft(np.fft.rfft(a, nfft) * np.fft.rfft(b, nfft), nfft)
+    # older numpy computes FFTs in double precision only
+    return res[..., :n].astype(np.result_type(a, b), copy=False)
+
+
 def convMatrix(y):
     """Returns matrix M, whose rows are filled with shifted copies of vector y
 
@@ -323,13 +761,13 @@ def convMatrix(y):
         a vector
 
     """
-    M = np.zeros((len(y), len(y)), "d")
+    M = np.zeros((len(y), len(y)), y.dtype)
     for i in range(len(y)):
         M[i, i:] = y[: len(y) - i]
     return M
 
 
-def computeA1E(E, g, beta, dE):
+def computeA1E(E, g, beta, dE, g0=None):
     """Compute A_1(E)
 
     A_1(E) = g(E)/(E*gamma_0) / (exp(E/kBT) - 1)
@@ -352,25 +790,26 @@ def computeA1E(E, g, beta, dE):
         phonon DOS for the given E
 
     beta:float
-        1/(kBT)
+        1/(kBT). An array of shape (nT, 1) gives one A_1(E) per temperature
+
+    g0:float
+        gamma0. computed from g if not given. shape (nT, 1) if beta is an array
 
     """
     zero_ind = len(E) - 1
-    g0 = gamma0(E, g, beta, dE)
-    E, g = reflected(E, g)
-    # t = 1./(np.exp(E*beta) - 1) # XXX
-    with warnings.catch_warnings():
-        warnings.simplefilter("ignore")
-        with np.errstate(divide="ignore"):
-            t = 1.0 / (1 - np.exp(-E * beta))  # XXX
+    table = thermalTable(E, beta)
+    if g0 is None:
+        g0 = gamma0(E, g, beta, dE)
+    g = reflected(E, g)[1]
     with np.errstate(invalid="ignore"):
-        t = g / (E * g0) * t
+        t = g * table.occupation_over_E / g0
     z = zero_ind
     # remove NaN
-    t[z] = max(0, t[z + 1] + (t[z + 1] - t[z + 2]))
+    extrapolated = t[..., z + 1] + (t[..., z + 1] - t[..., z + 2])
+    t[..., z] = np.where(extrapolated > 0, extrapolated, 0)
     # XXX: normalize?
     # t /= t.sum()
-    return E, t
+    return table.Er.copy(), t
 
 
 def reflected(x, y):
@@ -382,6 +821,9 @@ def reflected(x, y):
     The reflected function has the property
     y(-x) = y(x)
 
+    Each output is allocated once and filled from reversed views of the input.
+    Stacks of y are reflected along the last axis.
+
     Parameters
     ----------
     x:float
@@ -391,30 +833,94 @@ def reflected(x, y):
         a vector
 
     """
+    n = x.shape[-1]
+    xr = np.empty(2 * n - 1, dtype=x.dtype)
+    np.negative(x[::-1], out=xr[:n])
+    xr[n:] = x[1:]
+    yr = np.empty(y.shape[:-1] + (2 * n - 1,), dtype=y.dtype)
+    yr[..., :n] = y[..., ::-1]
+    yr[..., n:] = y[..., 1:]
+    return xr, yr
 
-    def reflect(a, multiplier):
-        t = (multiplier * a).tolist()
-        t.reverse()
-        return np.concatenate((t, a[1:]), 0)
 
-    return reflect(x, -1), reflect(y, 1)
+class ThermalTable:
+    """Thermal factors on an energy axis at a temperature
 
+    They depend only on the energy axis and beta, so a table is built once
+    for each (E axis, beta) and shared. See thermalTable.
+    All arrays are read-only.
 
-def coth(x):
-    """Parameters
+    Attributes
+    ----------
+    E: numpy array
+        energy axis. It starts with 0
+
+    beta: float
+        1/(kBT). An array of shape (nT, 1) gives one row per temperature in every table
+
+    Er: numpy array
+        reflected energy axis [-Emax, Emax]
+
+    occupation_over_E: numpy array
+        1/(1-exp(-E*beta))/E on Er. Not finite at E=0
+
+    coth_over_E: numpy array
+        coth(E*beta/2)/E on E. Not finite at E=0
+
+    E_over_occupation: numpy array
+        (1-exp(-E*beta))*E on E
+
+    """
+
+    def __init__(self, E, beta):
+        self.E = E = np.array(E, dtype=float)
+        self.beta = beta
+        Er = reflected(E, E)[0]
+        with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+            # 1-exp(-x) = -expm1(-x) is accurate at small x
+            self.occupation_over_E = -1.0 / (np.expm1(-Er * beta) * Er)
+            self.coth_over_E = coth(beta * E / 2.0) / E
+        self.E_over_occupation = -np.expm1(-E * beta) * E
+        self.Er = Er
+        for a in self.E, self.Er, self.occupation_over_E, self.coth_over_E, self.E_over_occupation:
+            a.flags.writeable = False
+        return
+
+
+def thermalTable(E, beta):
+    """Return the ThermalTable for the given energy axis and beta
+
+    Tables are memoized in multiphonon.forward.cache.forward_cache,
+    keyed on the energy axis and beta only
+
+    Parameters
     ----------
+    E: float
+        energy transfer axis, starting with 0
+
+    beta:float
+        1/(kBT). An array of shape (nT, 1) for a table of several temperatures
+
+    """
+    from .cache import fingerprint, forward_cache
+
+    key = "thermal", fingerprint(E, np.asarray(beta, dtype=float))
+    return forward_cache.get(key, lambda: ThermalTable(E, beta))
 
+
+def coth(x):
+    """Hyperbolic cotangent, without overflow for large arguments
+
+    Parameters
+    ----------
     x:float
         a vector
 
     """
-    with warnings.catch_warnings():
-        warnings.simplefilter("ignore")
-        with np.errstate(divide="ignore"):
-            tentative = np.cosh(x) / np.sinh(x)
-    tentative[x > 10] = 1.0
-    tentative[x < -10] = -1
-    return tentative
+    # coth(x) = 1 + 2/(exp(2x)-1) for x>0, and odd.
+    # exp(2x) overflows to inf for large x, giving 1
+    with np.errstate(divide="ignore", over="ignore"):
+        return np.copysign(1.0 + 2.0 / np.expm1(2 * np.abs(x)), x)
 
 
 def gamma0(E, g, beta, dE):
@@ -433,7 +939,7 @@ def gamma0(E, g, beta, dE):
         phonon DOS for the given E
 
     beta:float
-        1/(kBT)
+        1/(kBT). An array of shape (nT, 1) gives an array of gamma0, shape (nT,)
 
     """
     assert abs(E[0]) < 1e-7  # E[0] must be 0
@@ -444,10 +950,10 @@ def gamma0(E, g, beta, dE):
         raise RuntimeError("integrated dos should be 1, got %s instead" % (dos_integrated,))
     # compute function to integrate
     with np.errstate(invalid="ignore"):
-        f = coth(beta * E / 2.0) * g / E
+        f = thermalTable(E, beta).coth_over_E * g
     # f[0] would be nan, replace that with "extrapolation"
-    f[0] = f[1] - (f[2] - f[1])
-    return np.sum(f) * dE
+    f[..., 0] = f[..., 1] - (f[..., 2] - f[..., 1])
+    return np.sum(f, axis=-1) * dE
 
 
 r"""
@@ -513,9 +1019,12 @@ def fitparabolic(x, y):
     return (x2 * y).sum() / (x2 * x2).sum()
 
 
-def DWExp(Q, M, E, g, beta, dE):
+def DWExp(Q, M, E, g, beta, dE, g0=None):
     """Compute 2W, the exponent of the Debye Waller factor.
 
+    The recoil energies on the Q axis are memoized in
+    multiphonon.forward.cache.forward_cache, keyed on the Q axis and M only.
+
     Parameters
     ----------
     Q:float
@@ -536,9 +1045,15 @@ def DWExp(Q, M, E, g, beta, dE):
     beta:float
         1/(kBT)
 
+    g0:float
+        gamma0. computed from g if not given
+
     """
-    g0 = gamma0(E, g, beta, dE)
-    Er = recoilE(Q, M)
+    from .cache import fingerprint, forward_cache
+
+    if g0 is None:
+        g0 = gamma0(E, g, beta, dE)
+    Er = forward_cache.get(("recoilE", fingerprint(Q), M), lambda: recoilE(Q, M))
     return Er * g0
 
 
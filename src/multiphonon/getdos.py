@@ -30,6 +30,7 @@ def getDOS(
     workdir="work",
     iqe_h5="iqe.h5",
     maxiter=10,
+    parallel_reduction=False,
 ):
     """Compute DOS from direct-geometry powder neutron scattering spectrum
     by performing multiphonon and multiple-scattering corrections.
@@ -95,8 +96,11 @@ def getDOS(
     maxiter: int
         Max iteration
 
+    parallel_reduction: boolean
+        If True, reduce the sample and empty can nxs files concurrently. See reduce2iqe
+
     """
-    for msg in reduce2iqe(sample_nxs, Emin, Emax, dE, Qmin, Qmax, dQ, mt_nxs, iqe_h5, workdir):
+    for msg in reduce2iqe(sample_nxs, Emin, Emax, dE, Qmin, Qmax, dQ, mt_nxs, iqe_h5, workdir, parallel=parallel_reduction):
         yield msg
     iqe_h5, mtiqe_h5, Qaxis, Eaxis = msg
     iqehist = hh.load(iqe_h5)
@@ -160,6 +164,7 @@ def reduce2iqe(
     mt_nxs=None,
     iqe_h5="iqe.h5",
     workdir="work",
+    parallel=False,
 ):
     """Reduce sample and (optionally) empty can nxs files and generate I(Q,E)
     histograms.
@@ -201,6 +206,9 @@ def reduce2iqe(
     workdir: str
         path to working directory
 
+    parallel: boolean
+        If True, reduce the sample and empty can nxs files concurrently in a process pool
+
     """
     # prepare paths
     if not os.path.exists(workdir):
@@ -211,19 +219,46 @@ def reduce2iqe(
     Eaxis = _normalize_axis_setting(Emin, Emax, dE)
     Eaxis = _checkEaxis(*Eaxis)
     Qaxis = _normalize_axis_setting(Qmin, Qmax, dQ)
-    yield "Converting sample data to powder I(Q,E)..."
-    raw2iqe(sample_nxs, iqe_h5, Eaxis, Qaxis, type="sample")
     if mt_nxs is not None:
         _tomtpath = lambda p: os.path.join(os.path.dirname(p), "mt-" + os.path.basename(p))
         mtiqe_h5 = _tomtpath(iqe_h5)
-        yield "Converting MT data to powder I(Q,E)..."
-        raw2iqe(mt_nxs, mtiqe_h5, Eaxis, Qaxis, type="MT")
     else:
         mtiqe_h5 = None
+    if parallel and mt_nxs is not None:
+        for msg in _raw2iqe_parallel(sample_nxs, iqe_h5, mt_nxs, mtiqe_h5, Eaxis, Qaxis):
+            yield msg
+    else:
+        yield "Converting sample data to powder I(Q,E)..."
+        raw2iqe(sample_nxs, iqe_h5, Eaxis, Qaxis, type="sample")
+        if mt_nxs is not None:
+            yield "Converting MT data to powder I(Q,E)..."
+            raw2iqe(mt_nxs, mtiqe_h5, Eaxis, Qaxis, type="MT")
     yield "Results: sample IQE, MT IQE, Qaxis, Eaxis"
     yield iqe_h5, mtiqe_h5, Qaxis, Eaxis
 
 
+def _raw2iqe_parallel(sample_nxs, iqe_h5, mt_nxs, mtiqe_h5, Eaxis, Qaxis):
+    """Reduce sample and MT nxs files concurrently in two processes.
+
+    Yields the same progress messages as the serial path.
+    Each reduction runs in a freshly spawned process,
+    so the Mantid framework is never shared or forked.
+    Scripts using this must guard their main code with
+    `if __name__ == "__main__":`.
+    """
+    import multiprocessing as mp
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=2, mp_context=mp.get_context("spawn")) as pool:
+        sample = pool.submit(raw2iqe, sample_nxs, iqe_h5, Eaxis, Qaxis, "sample")
+        mt = pool.submit(raw2iqe, mt_nxs, mtiqe_h5, Eaxis, Qaxis, "MT")
+        yield "Converting sample data to powder I(Q,E)..."
+        sample.result()
+        yield "Converting MT data to powder I(Q,E)..."
+        mt.result()
+    return
+
+
 def _checkEaxis(Emin, Emax, dE):
     saved = Emin, Emax, dE
     centers = np.arange(Emin, Emax, dE)
@@ -254,10 +289,14 @@ def _md5(s):
     return hashlib.md5(s).hexdigest()
 
 
-def raw2iqe(eventnxs, iqe_h5, Eaxis, Qaxis, type):  # noqa A002
+def raw2iqe(eventnxs, iqe_h5, Eaxis, Qaxis, type, cache=None):  # noqa A002
     """Read and reduce a raw nxs file.  If the reduced file already exists it
     will read the existing file rather than recreate it.
 
+    Reduction results are also kept in a reduction cache shared by
+    all work directories, keyed by the content of the raw data file
+    and the axes. See multiphonon.redcache.
+
     Parameters
     ----------
     eventnxs : str
@@ -275,11 +314,22 @@ def raw2iqe(eventnxs, iqe_h5, Eaxis, Qaxis, type):  # noqa A002
 
     type : str
 
+    cache : multiphonon.redcache.ReductionCache
+        Reduction cache. Default: the cache configured by the environment. False: no cache
+
     """
+    from . import redcache
+
+    if cache is None:
+        cache = redcache.defaultCache()
+    elif cache is False:
+        cache = None
     # if iqe_h5 exists and the parameters do not match,
-    # we need to remove the old result
+    # we need to remove the old result.
+    # the raw file is identified by its size and mtime here, so reuse does not read it
     parameters_fn = os.path.join(os.path.dirname(iqe_h5), "raw2iqe-%s.params" % type)
-    parameters_text = "nxs=%s\nEaxis=%s\nQxis=%s\n" % (eventnxs, Eaxis, Qaxis)
+    st = os.stat(eventnxs)
+    parameters_text = "nxs=%s\nstat=%s,%s\nEaxis=%s\nQxis=%s\n" % (eventnxs, st.st_size, st.st_mtime_ns, Eaxis, Qaxis)
     remove_cache = False
     if os.path.exists(iqe_h5):
         if os.path.exists(parameters_fn):
@@ -292,16 +342,27 @@ def raw2iqe(eventnxs, iqe_h5, Eaxis, Qaxis, type):  # noqa A002
     if remove_cache:
         os.remove(iqe_h5)
     #
-    from .redutils import reduce
-
-    Emin, Emax, dE = Eaxis
-    Emin -= dE / 2
-    Emax -= dE / 2  # mantid algo use bin boundaries
-    Qmin, Qmax, dQ = Qaxis
-    Qmin -= dQ / 2
-    Qmax -= dQ / 2
-    # reduce
-    if not os.path.exists(iqe_h5):
+    reduced = False
+    if os.path.exists(iqe_h5):
+        import warnings
+
+        msg = "Reusing old reduction result from %s" % iqe_h5
+        warnings.warn(msg)
+    elif cache is not None and cache.get(_cacheKey(cache, eventnxs, Eaxis, Qaxis), iqe_h5):
+        import warnings
+
+        msg = "Reusing cached reduction result of %s" % eventnxs
+        warnings.warn(msg)
+    else:
+        from .redutils import reduce
+
+        Emin, Emax, dE = Eaxis
+        Emin -= dE / 2
+        Emax -= dE / 2  # mantid algo use bin boundaries
+        Qmin, Qmax, dQ = Qaxis
+        Qmin -= dQ / 2
+        Qmax -= dQ / 2
+        # reduce
         qaxis = Qmin, dQ, Qmax
         eaxis = Emin, dE, Emax
         if sys.version_info < (3, 0) and isinstance(eventnxs, unicode):
@@ -309,19 +370,22 @@ def raw2iqe(eventnxs, iqe_h5, Eaxis, Qaxis, type):  # noqa A002
         if sys.version_info < (3, 0) and isinstance(iqe_h5, unicode):
             iqe_h5 = iqe_h5.encode()
         reduce(eventnxs, qaxis, iqe_h5, eaxis=eaxis, tof2E="guess", ibnorm="ByCurrent")
-    else:
-        import warnings
-
-        msg = "Reusing old reduction result from %s" % iqe_h5
-        warnings.warn(msg)
+        reduced = True
     # fix energy axis if necessary
     _fixEaxis(iqe_h5, Eaxis)
+    if reduced and cache is not None:
+        cache.put(_cacheKey(cache, eventnxs, Eaxis, Qaxis), iqe_h5)
     # save parameters
     with open(parameters_fn, "wt") as stream:
         stream.write(parameters_text)
     return
 
 
+def _cacheKey(cache, eventnxs, Eaxis, Qaxis):
+    """Key of a reduction result in the reduction cache: content of the raw data file and the axes"""
+    return _md5(("md5=%s\nEaxis=%s\nQxis=%s\n" % (cache.fileFingerprint(eventnxs), Eaxis, Qaxis)).encode())
+
+
 def _fixEaxis(iqe_h5_path, Eaxis):
     """When iqe is obtained from a nxs or nxspe file where
     tof axis is already converted to E, the reduced data may
@@ -6,22 +6,79 @@
 """compute multiple scattering"""
 
 
-def sqe(mpsqe, Ei):
-    """Given multiphonon SQE, compute multiple scattering sqe"""
+def sqe(mpsqe, Ei, mask=None):
+    """Given multiphonon SQE, compute multiple scattering sqe
+
+    Parameters
+    ----------
+    mpsqe: histogram
+        multiphonon S(Q,E). It is not modified
+
+    Ei:float
+        incident energy
+
+    mask: numpy array of booleans
+        precomputed mask of dynamical range. True means outside.
+        If not given, it is computed by sqe.dynamical_range_mask, which
+        caches it per (Q axis, E axis, Ei)
+
+    """
     # multiple scattering (MS) is uniform along Q
     # so we want to compute the average S from multi-phonon
     # scattering and assign the value to MS result
     # first compute the mask
+    if mask is None:
+        from .sqe import dynamical_range_mask
+
+        mask = dynamical_range_mask(mpsqe, Ei)
+    aveS = average_over_Q([(slice(None), mpsqe.I)], mask)
+    return sqe_from_average(mpsqe, aveS, mask)
+
+
+def average_over_Q(blocks, mask):
+    """Average multiphonon S(Q,E) over Q inside the dynamical range, for every E
+
+    The average is reduced incrementally, so S(Q,E) can be given in blocks of Q
+    (see multiphonon.forward.phonon.sqe_blocks) and never held in memory at once.
+
+    Parameters
+    ----------
+    blocks: iterable
+        (rows, S) pairs. rows is a slice of the Q axis, and S the multiphonon S(Q,E) of those rows
+
+    mask: numpy array of booleans
+        mask of dynamical range of the whole S(Q,E). True means outside
+
+    """
     import numpy as np
 
-    from .sqe import dynamical_range_mask
+    total = count = 0
+    for rows, S in blocks:
+        inside = np.logical_not(mask[rows])
+        total = total + S.sum(0, where=inside)
+        count = count + inside.sum(0)
+        continue
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return total / count
+
+
+def sqe_from_average(mpsqe, aveS, mask):
+    """Create the multiple scattering S(Q,E) from its average over Q
+
+    Parameters
+    ----------
+    mpsqe: histogram
+        multiphonon S(Q,E). Provides the axes. It is not modified
+
+    aveS: numpy array
+        average over Q. See average_over_Q
+
+    mask: numpy array of booleans
+        mask of dynamical range. True means outside
+
+    """
+    import numpy as np
 
-    mask = dynamical_range_mask(mpsqe, Ei)
-    # set outside to zero
-    mpsqe.I[mask] = 0
-    # average
-    aveS = mpsqe.I.sum(0) / np.logical_not(mask).sum(0)
-    # res
     mssqe = mpsqe.copy()
     mssqe.I[:] = aveS[np.newaxis, :]
     mssqe.I[mask] = np.nan
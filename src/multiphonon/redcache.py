@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+#
+
+"""cache of reduced I(Q,E) histograms
+
+Reduction results are stored in a cache directory shared by all work
+directories, under a key derived from the content of the raw data file
+and the reduction parameters. Renamed or copied raw data files hit the
+cache, while a file overwritten in place misses it.
+
+The cache directory is ~/.cache/multiphonon/reduction, or the directory
+given by the environment variable MULTIPHONON_REDUCTION_CACHE.
+Set that variable to an empty string to disable the cache.
+The total size of the cache is bounded by MULTIPHONON_REDUCTION_CACHE_SIZE
+(in bytes, default 2GB); the least recently used entries are evicted first.
+
+The content fingerprints of raw data files are kept in the fingerprints
+subdirectory, by path, size and mtime, so a raw data file is read once
+and not in every process that looks it up.
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+
+DEFAULT_MAXSIZE = 2 * 1024**3
+
+# content fingerprints of files. path -> (size, mtime, fingerprint)
+_fingerprints = {}
+_lock = threading.Lock()
+
+
+def fileFingerprint(path, blocksize=1 << 20):
+    """Return the md5 hex digest of the content of a file
+
+    The digest is memoized in-process by path, size and mtime of the file.
+    """
+    import hashlib
+
+    path = os.path.abspath(path)
+    st = os.stat(path)
+    with _lock:
+        cached = _fingerprints.get(path)
+    if cached is not None and cached[:2] == (st.st_size, st.st_mtime_ns):
+        return cached[2]
+    md5 = hashlib.md5()
+    with open(path, "rb") as stream:
+        for block in iter(lambda: stream.read(blocksize), b""):
+            md5.update(block)
+    fingerprint = md5.hexdigest()
+    with _lock:
+        _fingerprints[path] = st.st_size, st.st_mtime_ns, fingerprint
+    return fingerprint
+
+
+class ReductionCache:
+    """A size-bounded directory of reduction results
+
+    Parameters
+    ----------
+    path: str
+        cache directory
+
+    maxsize: int
+        maximum total size of the cached files in bytes
+
+    """
+
+    def __init__(self, path, maxsize=DEFAULT_MAXSIZE):
+        self.path = path
+        self.maxsize = maxsize
+        return
+
+    def get(self, key, dest):
+        """Copy the cached result of the given key to dest
+
+        Returns True if found, False otherwise.
+        """
+        entry = self._entry(key)
+        try:
+            shutil.copyfile(entry, dest)
+        except FileNotFoundError:
+            # missing, or evicted by another process in the meantime
+            return False
+        # mark as recently used
+        try:
+            os.utime(entry)
+        except OSError:
+            pass
+        return True
+
+    def put(self, key, src):
+        """Store a copy of the file src as the result of the given key"""
+        if not os.path.exists(self.path):
+            os.makedirs(self.path, exist_ok=True)
+        # copy then rename, so concurrent readers never see a partial file
+        fd, tmp = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+        os.close(fd)
+        try:
+            shutil.copyfile(src, tmp)
+            os.replace(tmp, self._entry(key))
+        except BaseException:
+            os.remove(tmp)
+            raise
+        self.evict()
+        return
+
+    def evict(self):
+        """Remove the least recently used entries until the cache fits in maxsize"""
+        entries = []
+        for fn in os.listdir(self.path):
+            if not fn.endswith(".h5"):
+                continue
+            p = os.path.join(self.path, fn)
+            try:
+                st = os.stat(p)
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, p))
+            continue
+        total = sum(size for _, size, _ in entries)
+        for _, size, p in sorted(entries):
+            if total <= self.maxsize:
+                break
+            try:
+                os.remove(p)
+            except FileNotFoundError:
+                pass
+            total -= size
+            continue
+        return
+
+    def fileFingerprint(self, path):
+        """Return the md5 hex digest of the content of a file
+
+        The digest is saved in the cache directory by path, size and mtime of the file.
+        """
+        import hashlib
+        import json
+
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        stat = [st.st_size, st.st_mtime_ns]
+        record = os.path.join(self.path, "fingerprints", hashlib.md5(path.encode()).hexdigest() + ".json")
+        try:
+            with open(record) as stream:
+                saved = json.load(stream)
+            if saved["path"] == path and saved["stat"] == stat:
+                return saved["md5"]
+        except (OSError, ValueError, KeyError):
+            pass
+        fingerprint = fileFingerprint(path)
+        os.makedirs(os.path.dirname(record), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(record), suffix=".tmp")
+        with os.fdopen(fd, "wt") as stream:
+            json.dump(dict(path=path, stat=stat, md5=fingerprint), stream)
+        os.replace(tmp, record)
+        return fingerprint
+
+    def _entry(self, key):
+        return os.path.join(self.path, key + ".h5")
+
+
+def defaultCache():
+    """Return the reduction cache configured by the environment, or None if disabled"""
+    path = os.environ.get("MULTIPHONON_REDUCTION_CACHE")
+    if path is None:
+        path = os.path.join(os.path.expanduser("~"), ".cache", "multiphonon", "reduction")
+    if not path:
+        return None
+    maxsize = int(os.environ.get("MULTIPHONON_REDUCTION_CACHE_SIZE", DEFAULT_MAXSIZE))
+    return ReductionCache(path, maxsize=maxsize)
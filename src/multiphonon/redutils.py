@@ -1,28 +1,70 @@
-import sys
+import os
 
 mantid_checked = False
 
 
 def _checkMantid():
-    print("* Checking Mantid ...")
-    import shlex
-    import subprocess as sp
-
-    sp.call(
-        shlex.split("python -c 'import matplotlib, mantid'"),
-        stdout=sp.PIPE,
-        stderr=sp.PIPE,
-    )  # sometimes mantid import for the first time may fail
-    if sp.call(shlex.split("python -c 'import matplotlib, mantid'")):
-        raise RuntimeError("Please install mantid")
+    """Make sure mantid is available
+
+    The check is done in-process, and only once per process.
+    It is deferred until a reduction is requested,
+    so importing this module is cheap.
+    """
     global mantid_checked
+    if mantid_checked:
+        return
+    print("* Checking Mantid ...")
+    import importlib
+
+    def _import():
+        importlib.import_module("matplotlib")
+        importlib.import_module("mantid")
+        return
+
+    try:
+        _import()
+    except ImportError:
+        # sometimes mantid import for the first time may fail
+        try:
+            _import()
+        except ImportError as e:
+            raise RuntimeError("Please install mantid") from e
     mantid_checked = True
     print("  - Done.")
     return
 
 
-if not mantid_checked:
-    _checkMantid()
+# verdicts of isRawNexus. path -> (mtime, verdict)
+_nexus_kinds = {}
+
+
+def isRawNexus(path):
+    """Guess whether a NeXus file is raw (time of flight) event data
+
+    Raw data files have root "entry". Processed files, already converted
+    to energy transfer, have a mantid workspace as root.
+    Only the top-level group of the file is read. The verdict is cached
+    by path and modification time of the file.
+
+    Parameters
+    ----------
+    path: str
+        path to nxs file
+
+    """
+    path = os.path.abspath(path)
+    mtime = os.stat(path).st_mtime_ns
+    cached = _nexus_kinds.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    import h5py
+
+    # XXX: this is a simple guess. all raw data files seem to have root "entry"
+    with h5py.File(path, "r") as f:
+        names = sorted(f.keys())
+    verdict = bool(names) and names[0] == "entry"
+    _nexus_kinds[path] = mtime, verdict
+    return verdict
 
 
 def reduce(
@@ -69,21 +111,14 @@ def reduce(
         For more details, see http://docs.mantidproject.org/nightly/algorithms/DgsReduction-v1.html
 
     """
+    _checkMantid()
     import mantid.simpleapi as msa
     from mantid import mtd
     from mantid.simpleapi import DgsReduction, Load
 
     msa.config.setFacility("SNS")
     if tof2E == "guess":
-        # XXX: this is a simple guess. all raw data files seem to have root "entry"
-        cmd = "h5ls %s" % nxsfile
-        import shlex
-        import subprocess as sp
-
-        o = sp.check_output(shlex.split(cmd)).strip().split()[0]
-        if sys.version_info >= (3, 0) and isinstance(o, bytes):
-            o = o.decode()
-        tof2E = o == "entry"
+        tof2E = isRawNexus(nxsfile)
     if tof2E:
         if use_ei_guess:
             DgsReduction(
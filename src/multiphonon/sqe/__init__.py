@@ -9,6 +9,11 @@ import importlib.util
 import histogram as H
 import numpy as np
 
+from ..forward.cache import LRUCache, fingerprint
+
+# dynamical range masks per (Q axis, E axis, Ei)
+_mask_cache = LRUCache(maxsize=8)
+
 
 def load_source(modname, filename):
     loader = importlib.machinery.SourceFileLoader(modname, filename)
@@ -75,6 +80,10 @@ def plot(iqe, ax=None, colorbar=True):
 def interp(iqehist, newE):
     """Compute a new IQE histogram from the given IQE using the new energy array by interpolation
 
+    The interpolation is linear along E for all Q at once.
+    For each Q, the new bins outside of the measured energy range of
+    the input IQE are set to NaN.
+
     Parameters
     ----------
     iqehist: histogram
@@ -84,53 +93,86 @@ def interp(iqehist, newE):
         new energy centers in meV
 
     """
-    from scipy import interpolate
-
     mask = iqehist.I != iqehist.I
-
-    # find energy boundaries of dynamic range for each Q
-    def get_boundary_indexes(a):
-        nz = np.nonzero(a)[0]
-        if nz.size:
-            return nz[0], nz[-1]
-        else:
-            return 0, 0
-
-    boundary_indexes = [get_boundary_indexes(row) for row in np.logical_not(mask)]
     try:
         E = iqehist.energy
     except:
         E = iqehist.E
-    Eranges = [(E[ind1], E[ind2]) for ind1, ind2 in boundary_indexes]
+    Q = iqehist.Q
+    # find energy boundaries of dynamic range for each Q
+    valid = np.logical_not(mask)
+    has_data = valid.any(axis=1)
+    first = np.where(has_data, valid.argmax(axis=1), 0)
+    last = np.where(has_data, E.size - 1 - valid[:, ::-1].argmax(axis=1), 0)
+    Emins = E[first]
+    Emaxs = E[last]
     #
     iqehist.I[mask] = 0
     iqehist.E2[mask] = 0
-    Q = iqehist.Q
-    f = interpolate.RectBivariateSpline(E, Q, iqehist.I.T, kx=1, ky=1)
-    E2f = interpolate.RectBivariateSpline(E, Q, iqehist.E2.T, kx=1, ky=1)
-    dE = E[1] - E[0]
-    Emin = E[0] // dE * dE
-    Emax = E[-1] // dE * dE
-    # Enew = np.arange(Emin, Emax+dE/2, dE)
-    newS = f(newE, Q).T
-    newS_E2 = E2f(newE, Q).T
+    newS = interp_along_E(E, iqehist.I, newE)
+    newS_E2 = interp_along_E(E, iqehist.E2, newE)
+    # mask out the new bins outside of the dynamical range
+    newmask = _outside_Erange(newE, Emins, Emaxs)
+    newS[newmask] = np.nan
+    newS_E2[newmask] = np.nan
     # create new histogram
     Eaxis = H.axis("E", newE, unit="meV")
     Qaxis = H.axis("Q", Q, unit="1./angstrom")
-    newHist = H.histogram("IQE", [Qaxis, Eaxis], data=newS, errors=newS_E2)
-    #
-    for Erange, q in zip(Eranges, Q):
-        Emin, Emax = Erange
-        if Emin > newE[0]:
-            Emin = min(Emin, newE[-1])
-            newHist[q, (None, Emin)].I[:] = np.nan
-            newHist[q, (None, Emin)].E2[:] = np.nan
-        if Emax < newE[-1]:
-            Emax = max(Emax, newE[0])
-            newHist[q, (Emax, None)].I[:] = np.nan
-            newHist[q, (Emax, None)].E2[:] = np.nan
-        continue
-    return newHist
+    return H.histogram("IQE", [Qaxis, Eaxis], data=newS, errors=newS_E2)
+
+
+def astype(iqehist, dtype):
+    """Return a copy of the given IQE histogram with intensities and errors of the given floating point type
+
+    Parameters
+    ----------
+    iqehist: histogram
+        input IQE
+
+    dtype: numpy dtype
+        for example "f" for float32
+
+    """
+    return H.histogram(iqehist.name(), iqehist.axes(), data=iqehist.I.astype(dtype), errors=iqehist.E2.astype(dtype))
+
+
+def interp_along_E(E, I, newE):
+    """Linearly interpolate every row of a 2D array along the E axis
+
+    Values outside of the E range are clamped to the boundary values,
+    same as np.interp.
+
+    Parameters
+    ----------
+    E:numpy array of floats
+        incremental energy centers. size nE
+
+    I:numpy array of floats
+        data array. shape (nQ, nE)
+
+    newE:numpy array of floats
+        new energy centers
+
+    """
+    index = np.clip(np.searchsorted(E, newE, side="right") - 1, 0, E.size - 2)
+    w = np.clip((newE - E[index]) / (E[index + 1] - E[index]), 0, 1)
+    return I[:, index] * (1 - w) + I[:, index + 1] * w
+
+
+def _outside_Erange(newE, Emins, Emaxs):
+    """Compute mask of the new energy bins outside of [Emin, Emax] for each Q.
+
+    A bin that contains Emin or Emax is also masked.
+    """
+    dE = newE[1] - newE[0]
+    # index of the bin containing a value
+    bin_index = lambda x: np.clip(np.floor((x - newE[0]) / dE + 0.5), 0, newE.size - 1).astype(int)
+    Emins = np.minimum(Emins, newE[-1])
+    Emaxs = np.maximum(Emaxs, newE[0])
+    imin = np.where(Emins > newE[0], bin_index(Emins), -1)
+    imax = np.where(Emaxs < newE[-1], bin_index(Emaxs), newE.size)
+    indexes = np.arange(newE.size)[np.newaxis, :]
+    return (indexes <= imin[:, np.newaxis]) | (indexes >= imax[:, np.newaxis])
 
 
 def dynamical_range_mask(sqe, Ei):
@@ -138,6 +180,8 @@ def dynamical_range_mask(sqe, Ei):
     at the given incident energy.
     0 means within dynamical range
 
+    The mask is cached per (Q axis, E axis, Ei) and is read-only.
+
     Parameters
     ----------
     sqe: histogram
@@ -149,17 +193,36 @@ def dynamical_range_mask(sqe, Ei):
     """
     Q = sqe.Q
     E = sqe.E
-    Ef = Ei - E
+    return _mask_cache.get(
+        (fingerprint(Q, E), Ei),
+        lambda: dynamical_range_mask_QE(Q, E, Ei),
+    )
+
+
+def dynamical_range_mask_QE(Q, E, Ei):
+    """Calculate the mask of dynamical range for the given Q and E axes
+
+    See dynamical_range_mask. The Q and kf grids are never created;
+    the comparisons are broadcast over the (Q, E) plane.
+
+    Parameters
+    ----------
+    Q: numpy array
+        momentum transfer axis
+
+    E: numpy array
+        energy transfer axis
+
+    Ei:float
+        incident energy
+
+    """
     from ..units.neutron import SE2K, e2k
 
     ki = e2k(Ei)
-    kf = Ef**0.5 * SE2K
-    import numpy as np
-
-    kf = np.tile(kf, Q.size)
-    kf.shape = Q.size, -1
-    Q2d = np.repeat(Q, E.size)
-    Q2d.shape = Q.size, -1
-    mask = np.zeros(sqe.I.shape, dtype="bool")
-    mask = (ki + kf > Q2d) * (ki + Q2d > kf) * (kf + Q2d > ki)
-    return np.logical_not(mask)
+    with np.errstate(invalid="ignore"):
+        kf = (Ei - E) ** 0.5 * SE2K
+    Q = np.asarray(Q)[:, np.newaxis]
+    kf = kf[np.newaxis, :]
+    inside = (ki + kf > Q) & (ki + Q > kf) & (kf + Q > ki)
+    return np.logical_not(inside)
@@ -1,8 +1,13 @@
 # -*- python -*-
 #
 
+import os
 
-def process(sample_nxs_list, mt_nxs_list, parameter_yaml, data_folder=""):
+# name of the file recording the parameters of a finished job
+PARAMS_FILENAME = "batch.params"
+
+
+def process(sample_nxs_list, mt_nxs_list, parameter_yaml, data_folder="", workers=1, overwrite=False):
     """Process a series of files using a fixed set of parameters
 
     This implementation just shows one way of processing a batch job,
@@ -10,10 +15,38 @@ def process(sample_nxs_list, mt_nxs_list, parameter_yaml, data_folder=""):
     the sample and emtpy can nexus files.
     For more complex batch processing, a user could follow this example and
     implement his/her own methods.
-    """
-    import os
 
-    from ..getdos import getDOS
+    Each pair of sample and empty can files is processed in its own
+    work directory, data_folder/work-<sample>,<mt>, and its progress
+    messages are written to log.getdos there and printed as they come.
+    An empty can file shared by several jobs is reduced only once.
+    A failed job is reported and does not stop the other jobs.
+
+    Parameters
+    ----------
+    sample_nxs_list: list of str
+        sample nexus files
+
+    mt_nxs_list: list of str
+        empty can nexus files. None for no empty can
+
+    parameter_yaml: str
+        path to the yaml file of processing parameters
+
+    data_folder: str
+        parent directory of the work directories
+
+    workers: int
+        number of worker processes. 1: process the jobs one by one in this process
+
+    overwrite: boolean
+        If False, skip jobs whose final-dos.h5 was computed with the same parameters
+
+    Returns
+    -------
+    list of (workdir, status) tuples. status is "done", "skipped" or "failed"
+
+    """
     from . import Context, context2kargs
 
     assert len(sample_nxs_list) == len(mt_nxs_list)
@@ -24,7 +57,10 @@ def process(sample_nxs_list, mt_nxs_list, parameter_yaml, data_folder=""):
         del params.iqe_nxs
     if hasattr(params, "iqe_h5"):
         del params.iqe_h5
-    # process
+    # jobs
+    jobs = []
+    workdirs = []
+    statuses = {}
     for sample_nxs, mt_nxs in zip(sample_nxs_list, mt_nxs_list):
         params.sample_nxs = sample_nxs
         params.mt_nxs = mt_nxs
@@ -33,15 +69,263 @@ def process(sample_nxs_list, mt_nxs_list, parameter_yaml, data_folder=""):
             os.path.basename(sample_nxs),
             os.path.basename(mt_nxs) if mt_nxs else mt_nxs,
         )
-        workdir = os.path.join(data_folder, workdir)
-        print("workdir", workdir)
-        print("sampleeeee: ", os.path.basename(sample_nxs))
-
-        if not os.path.exists(workdir):
-            os.makedirs(workdir)
-        with open(os.path.join(workdir, "log.getdos"), "wt") as log:
-            kargs["workdir"] = workdir
-            print("* Processing %s, %s" % (sample_nxs, mt_nxs))
+        kargs["workdir"] = workdir = os.path.join(data_folder, workdir)
+        workdirs.append(workdir)
+        if not overwrite and _isDone(kargs):
+            print("* Skipping %s, %s: already done in %s" % (sample_nxs, mt_nxs, workdir))
+            statuses[workdir] = "skipped"
+        else:
+            jobs.append(kargs)
+        continue
+    # empty can files used by more than one job are reduced once
+    mt_count = {}
+    for kargs in jobs:
+        if kargs["mt_nxs"]:
+            mt_count[kargs["mt_nxs"]] = mt_count.get(kargs["mt_nxs"], 0) + 1
+        continue
+    shared_mts = [mt for mt, n in mt_count.items() if n > 1]
+    statuses.update(_schedule(jobs, shared_mts, data_folder, workers))
+    failed = [workdir for workdir, status in statuses.items() if status == "failed"]
+    if failed:
+        print("* %s job(s) failed. See log.getdos in %s" % (len(failed), ", ".join(failed)))
+    return [(workdir, statuses[workdir]) for workdir in workdirs]
+
+
+def _schedule(jobs, shared_mts, data_folder, workers):
+    """Run the jobs, and the shared empty can reductions they depend on, in a pool
+
+    Returns a dictionary of workdir -> status
+
+    At most `workers` tasks run at a time. If a worker process dies,
+    for example in a crash of Mantid, all tasks running in the pool fail
+    with BrokenProcessPool. The pool is restarted and those tasks are run
+    again one at a time, so that only the task that kills its worker fails.
+    """
+    import collections
+    from concurrent.futures import FIRST_COMPLETED, wait
+    from concurrent.futures.process import BrokenProcessPool
+
+    statuses = {}
+    if workers > 1:
+        import functools
+        import multiprocessing as mp
+        from concurrent.futures import ProcessPoolExecutor
+
+        # spawn, so the Mantid framework is never forked
+        context = mp.get_context("spawn")
+        manager = context.Manager()
+        messages = manager.Queue()
+        report = functools.partial(_put, messages)
+        newPool = functools.partial(ProcessPoolExecutor, max_workers=workers, mp_context=context)
+    else:
+        import queue
+
+        manager = None
+        messages = queue.Queue()
+        report = _print
+        newPool = _SerialExecutor
+    pool = newPool()
+    # future -> (task, alone). a task is (kind, item, function, args)
+    pending = {}
+
+    def submit(task, alone=False):
+        nonlocal pool
+        f, args = task[2:]
+        try:
+            future = pool.submit(f, *args)
+        except BrokenProcessPool:
+            print("* A worker process died. Restarting the process pool")
+            pool.shutdown(wait=False)
+            pool = newPool()
+            future = pool.submit(f, *args)
+        pending[future] = task, alone
+        return
+
+    try:
+        # tasks waiting for a free worker
+        ready = collections.deque()
+        # tasks that were running when a worker died
+        suspects = collections.deque()
+        broken = False
+        mtdirs = {}
+        for mt_nxs in shared_mts:
+            kargs = [k for k in jobs if k["mt_nxs"] == mt_nxs][0]
+            mtdirs[mt_nxs] = mtdir = os.path.join(data_folder, "work-MT-%s" % os.path.basename(mt_nxs))
+            ready.append(("MT", mt_nxs, _reduceMT, (mt_nxs, mtdir, kargs, report)))
+            continue
+        waiting = []
+        for kargs in jobs:
+            if kargs["mt_nxs"] in mtdirs:
+                waiting.append(kargs)
+            else:
+                ready.append(("job", kargs, _runJob, (kargs, report)))
+            continue
+        while pending or ready or suspects:
+            if broken and not pending:
+                print("* A worker process died. Restarting the process pool")
+                pool.shutdown(wait=False)
+                pool = newPool()
+                broken = False
+            if suspects:
+                # run the suspects alone, so that a crash tells which task killed the worker
+                if not pending:
+                    submit(suspects.popleft(), alone=True)
+            else:
+                while ready and len(pending) < workers:
+                    submit(ready.popleft())
+                    continue
+            done, _ = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+            _drain(messages)
+            for future in done:
+                task, alone = pending.pop(future)
+                kind, item = task[:2]
+                error = future.exception()
+                if isinstance(error, BrokenProcessPool):
+                    broken = True
+                    if not alone:
+                        suspects.append(task)
+                        continue
+                if kind == "job":
+                    statuses[item["workdir"]] = _status(item["workdir"], error)
+                    continue
+                # a shared empty can reduction finished. start the jobs waiting for it
+                for kargs in [k for k in waiting if k["mt_nxs"] == item]:
+                    waiting.remove(kargs)
+                    if error is None:
+                        _copyMT(mtdirs[item], kargs["workdir"])
+                        ready.append(("job", kargs, _runJob, (kargs, report)))
+                    else:
+                        print("* Failed to reduce %s: %s" % (item, error))
+                        statuses[kargs["workdir"]] = "failed"
+                    continue
+                continue
+        _drain(messages)
+    finally:
+        pool.shutdown()
+        if manager is not None:
+            manager.shutdown()
+    return statuses
+
+
+def _status(workdir, error):
+    if error is None:
+        print("* Done: %s" % workdir)
+        return "done"
+    print("* Failed: %s: %s" % (workdir, error))
+    return "failed"
+
+
+def _runJob(kargs, report):
+    """Run getDOS for one job, writing its messages to workdir/log.getdos"""
+    import traceback
+
+    from ..getdos import getDOS
+
+    workdir = kargs["workdir"]
+    if not os.path.exists(workdir):
+        os.makedirs(workdir)
+    # forget the previous result until this run succeeds
+    params_path = os.path.join(workdir, PARAMS_FILENAME)
+    if os.path.exists(params_path):
+        os.remove(params_path)
+    name = os.path.basename(workdir)
+    with open(os.path.join(workdir, "log.getdos"), "wt") as log:
+        report(name, "* Processing %s, %s" % (kargs["sample_nxs"], kargs["mt_nxs"]))
+        try:
             for msg in getDOS(**kargs):
                 log.write("%s\n" % (msg,))
+                log.flush()
+                report(name, msg)
+        except Exception:
+            log.write(traceback.format_exc())
+            raise
+    with open(params_path, "wt") as stream:
+        stream.write(_signature(kargs))
+    return
+
+
+def _reduceMT(mt_nxs, mtdir, kargs, report):
+    """Reduce an empty can file shared by several jobs into mtdir"""
+    from ..getdos import _checkEaxis, _normalize_axis_setting, raw2iqe
+
+    if not os.path.exists(mtdir):
+        os.makedirs(mtdir)
+    report(os.path.basename(mtdir), "Converting MT data to powder I(Q,E)...")
+    # same axes as reduce2iqe
+    Eaxis = _normalize_axis_setting(kargs["Emin"], kargs["Emax"], kargs["dE"])
+    Eaxis = _checkEaxis(*Eaxis)
+    Qaxis = _normalize_axis_setting(kargs["Qmin"], kargs["Qmax"], kargs["dQ"])
+    raw2iqe(mt_nxs, os.path.join(mtdir, "mt-iqe.h5"), Eaxis, Qaxis, type="MT")
+    return
+
+
+def _copyMT(mtdir, workdir):
+    """Copy a shared empty can reduction into a job workdir, where getDOS will reuse it"""
+    import shutil
+
+    if not os.path.exists(workdir):
+        os.makedirs(workdir)
+    for fn in "mt-iqe.h5", "raw2iqe-MT.params":
+        shutil.copyfile(os.path.join(mtdir, fn), os.path.join(workdir, fn))
+    return
+
+
+def _signature(kargs):
+    """Text identifying the parameters and input files of a job"""
+    lines = ["%s=%r" % (k, kargs[k]) for k in sorted(kargs)]
+    for k in "sample_nxs", "mt_nxs":
+        path = kargs[k]
+        if path and os.path.exists(path):
+            st = os.stat(path)
+            lines.append("%s.stat=%s,%s" % (k, st.st_size, st.st_mtime_ns))
         continue
+    return "\n".join(lines) + "\n"
+
+
+def _isDone(kargs):
+    """Check whether final-dos.h5 of a job exists and was computed with the same parameters"""
+    workdir = kargs["workdir"]
+    params_path = os.path.join(workdir, PARAMS_FILENAME)
+    if not os.path.exists(os.path.join(workdir, "final-dos.h5")) or not os.path.exists(params_path):
+        return False
+    with open(params_path) as stream:
+        return stream.read() == _signature(kargs)
+
+
+def _put(messages, name, msg):
+    messages.put((name, str(msg)))
+    return
+
+
+def _print(name, msg):
+    print("[%s] %s" % (name, msg))
+    return
+
+
+def _drain(messages):
+    import queue
+
+    while True:
+        try:
+            name, msg = messages.get_nowait()
+        except queue.Empty:
+            return
+        _print(name, msg)
+        continue
+
+
+class _SerialExecutor:
+    """Run submitted calls immediately, in this process"""
+
+    def submit(self, f, *args):
+        from concurrent.futures import Future
+
+        future = Future()
+        try:
+            future.set_result(f(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def shutdown(self, wait=True):
+        return
@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+#
+
+import os
+import tempfile
+import unittest
+
+import numpy as np
+from histograms import make_dos, make_sqe
+from multiphonon.backward import checkpoint
+
+
+class TestCase(unittest.TestCase):
+    def test1(self):
+        """checkpoint: save and load"""
+        sqe = make_sqe(1.0)
+        params = checkpoint.parameters(sqe, T=300, elastic_E_cutoff=(-12.0, 6.7), weights=np.array([0.5, 0.5]))
+        self.assertEqual(params["elastic_E_cutoff"], [-12.0, 6.7])
+        with tempfile.TemporaryDirectory() as workdir:
+            path = os.path.join(workdir, checkpoint.CHECKPOINT_FILENAME)
+            self.assertIsNone(checkpoint.load(path, sqe))
+            state = checkpoint.Checkpoint(3, False, params, make_sqe(2.0), make_sqe(3.0), make_sqe(4.0), make_dos(5.0))
+            checkpoint.save(path, state)
+            self.assertEqual(os.listdir(workdir), [checkpoint.CHECKPOINT_FILENAME])
+            saved = checkpoint.load(path, sqe)
+        self.assertEqual(saved.roundno, 3)
+        self.assertFalse(saved.converged)
+        self.assertEqual(saved.parameters, params)
+        self.assertTrue(np.allclose(saved.sqe.I, 2.0))
+        self.assertTrue(np.allclose(saved.corrected_sqe.I, 3.0))
+        self.assertTrue(np.allclose(saved.residual_sqe.E2, 0.4))
+        self.assertTrue(np.allclose(saved.dos.I, 5.0))
+        # the input sqe is not modified
+        self.assertTrue(np.allclose(sqe.I, 1.0))
+        return
+
+    def test2(self):
+        """checkpoint: parameter mismatches"""
+        params = checkpoint.parameters(make_sqe(1.0), T=300, elastic_E_cutoff=(-12.0, 6.7))
+        self.assertEqual(checkpoint.mismatches(params, params), [])
+        other = checkpoint.parameters(make_sqe(2.0), T=300.0, elastic_E_cutoff=(-12.0, 7))
+        self.assertEqual(checkpoint.mismatches(params, other), ["elastic_E_cutoff", "sqe"])
+        other = checkpoint.parameters(make_sqe(1.0), T=300, elastic_E_cutoff=(-12.0, 6.7), C_ms=0.2)
+        self.assertEqual(checkpoint.mismatches(params, other), ["C_ms"])
+        return
+
+    pass  # end of TestCase
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+#
+
+import unittest
+
+import numpy as np
+from histograms import make_dos
+from multiphonon.backward import convergence
+
+
+def make_record(roundno, residual_norm=np.nan, relative_change=np.nan, elapsed=0.0):
+    record = convergence.RoundRecord(roundno)
+    record.residual_norm = residual_norm
+    record.relative_change = relative_change
+    record.elapsed = elapsed
+    return record
+
+
+class TestCase(unittest.TestCase):
+    def test1(self):
+        """convergence.dosChange"""
+        record = convergence.RoundRecord(0)
+        convergence.dosChange(record, make_dos([1.0, 2.0, 2.0]), None)
+        self.assertTrue(np.isnan(record.l2))
+        convergence.dosChange(record, make_dos([1.0, 2.0, 2.0]), make_dos([1.0, 1.0, 4.0]))
+        self.assertAlmostEqual(record.l1, 3.0)
+        self.assertAlmostEqual(record.l2, 5**0.5)
+        self.assertAlmostEqual(record.max, 2.0)
+        self.assertAlmostEqual(record.relative_change, 5**0.5 / 3)
+        self.assertEqual(record.to_dict()["roundno"], 0)
+        return
+
+    def test2(self):
+        """convergence: stopping rules"""
+        rule = convergence.RelativeNorm(1e-3)
+        self.assertIsNone(rule(make_record(0), []))
+        self.assertIsNone(rule(make_record(1, relative_change=1e-2), []))
+        self.assertTrue(rule(make_record(2, relative_change=1e-4), []))
+        rule = convergence.Stagnation(window=2, min_improvement=0.1)
+        history = [make_record(0, 1.0), make_record(1, 0.5)]
+        self.assertIsNone(rule(make_record(2, 0.4), history))
+        history.append(make_record(2, 0.4))
+        self.assertTrue(rule(make_record(3, 0.49), history))
+        rule = convergence.TimeBudget(10)
+        self.assertIsNone(rule(make_record(0, elapsed=5), []))
+        self.assertTrue(rule(make_record(1, elapsed=11), []))
+        return
+
+    pass  # end of TestCase
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,25 @@
+#!/usr/bin/env python
+#
+
+"""small histograms shared by the tests of multiphonon.backward"""
+
+import histogram as H
+import numpy as np
+
+
+def make_sqe(value):
+    """A constant S(Q,E) with 10% errors"""
+    Q = np.arange(0, 5, 0.5)
+    E = np.arange(-10, 10, 1.0)
+    I = np.ones((Q.size, E.size)) * value
+    return H.histogram("sqe", [("Q", Q, "1./angstrom"), ("E", E, "meV")], data=I, errors=I * 0.1)
+
+
+def make_dos(value):
+    """A DOS with 1% errors on an energy axis of 1 meV steps
+
+    value is either a constant over 10 points, or the array of the DOS values
+    """
+    I = np.ones(10) * value if np.ndim(value) == 0 else np.asarray(value, dtype=float)
+    E = np.arange(0, I.size, 1.0)
+    return H.histogram("DOS", [("E", E, "meV")], data=I, errors=I * 0.01)
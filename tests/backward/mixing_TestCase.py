@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+#
+
+import unittest
+
+import numpy as np
+from multiphonon.backward import mixing
+
+
+def iterate(mixer, G, x, tolerance=1e-8, maxiter=500):
+    """Run the fixed-point iteration x -> G(x) with a mixer. Return the number of rounds and the solution"""
+    for i in range(maxiter):
+        g = G(x)
+        x1 = mixer(x, g)
+        # the mixed DOS keeps the scale of the new estimate
+        assert np.isclose(x1.sum(), g.sum())
+        x1 /= x1.sum()
+        if np.allclose(x1, x / x.sum(), rtol=tolerance, atol=tolerance):
+            return i + 1, x1
+        x = x1
+        continue
+    return maxiter, x
+
+
+def slow_map(n=30, seed=0):
+    """A contraction on DOS-like vectors that converges slowly in the plain iteration"""
+    rng = np.random.default_rng(seed)
+    P = rng.random((n, n))
+    P /= P.sum(0)
+    # mix with the identity to slow the plain iteration down
+    P = 0.95 * np.eye(n) + 0.05 * P
+    return lambda x: 2 * np.dot(P, x)
+
+
+class TestCase(unittest.TestCase):
+    def test1(self):
+        """PlainMixing returns the new estimate as is"""
+        mixer = mixing.createMixer()
+        x = np.array([1.0, 2.0, 3.0])
+        g = np.array([2.0, 2.0, 2.0])
+        self.assertIs(mixer(x, g), g)
+        self.assertEqual(len(mixer.residual_norms), 1)
+        self.assertAlmostEqual(mixer.residual_norms[0], mixing.residualNorm(x / 6, g / 6))
+        return
+
+    def test2(self):
+        """Damping and Anderson mixing reach the fixed point of the plain iteration"""
+        G = slow_map()
+        x0 = np.ones(30)
+        n_plain, plain = iterate(mixing.PlainMixing(), G, x0)
+        n_damped, damped = iterate(mixing.DampedMixing(0.8), G, x0)
+        anderson_mixer = mixing.createMixer("anderson")
+        n_anderson, anderson = iterate(anderson_mixer, G, x0)
+        for x in damped, anderson:
+            self.assertTrue(np.allclose(x, plain, atol=1e-6))
+        self.assertLess(n_anderson, n_plain / 3)
+        self.assertEqual(len(anderson_mixer.residual_norms), n_anderson)
+        return
+
+    def test3(self):
+        """mixing.createMixer"""
+        self.assertIsInstance(mixing.createMixer("damping"), mixing.DampedMixing)
+        mixer = mixing.AndersonMixing(depth=2)
+        self.assertIs(mixing.createMixer(mixer), mixer)
+        with self.assertRaises(ValueError):
+            mixing.createMixer("broyden")
+        return
+
+    def test4(self):
+        """Mixers keep the zeros of the new estimate"""
+        x = np.array([1.0, 2.0, 3.0, 1.0])
+        g = np.array([2.0, 2.0, 0.0, 1.0])
+        for mixer in mixing.DampedMixing(0.5), mixing.AndersonMixing():
+            mixed = mixer(x, g)
+            self.assertEqual(mixed[2], 0)
+            self.assertAlmostEqual(mixed.sum(), g.sum())
+            continue
+        return
+
+    pass  # end of TestCase
+
+
+if __name__ == "__main__":
+    unittest.main()
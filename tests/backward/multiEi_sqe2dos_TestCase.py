@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+#
+
+import os
+import tempfile
+import unittest
+import warnings
+
+import histogram.hdf as hh
+import numpy as np
+from multiphonon.backward import multiEi_sqe2dos, sqe2dos
+
+datadir = os.path.join(os.path.dirname(__file__), "../data")
+
+
+class TestCase(unittest.TestCase):
+    def setUp(self):
+        self.dos300 = hh.load(os.path.join(datadir, "graphite-Ei_300-dos.h5"))
+        self.iqe130 = hh.load(os.path.join(datadir, "graphite-Ei_130-iqe.h5"))
+        self.iqe30 = hh.load(os.path.join(datadir, "graphite-Ei_30-iqe.h5"))
+        return
+
+    def test1(self):
+        """multiphonon.backward.multiEi_sqe2dos: one dataset is the same as sqe2dos"""
+        with tempfile.TemporaryDirectory() as tmpdir, warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            workdir = os.path.join(tmpdir, "single")
+            os.makedirs(workdir)
+            expected = sqe2dos.sqe2dos(
+                self.iqe130.copy(),
+                T=300,
+                Ecutoff=100.0,
+                elastic_E_cutoff=(-30.0, 15),
+                M=12.0,
+                C_ms=0.02,
+                Ei=130.0,
+                workdir=workdir,
+                initdos=self.dos300,
+                MAX_ITERATION=5,
+                intermediate_output="none",
+            )
+            expected = list(expected)
+            iterdos = multiEi_sqe2dos.sqe2dos(
+                [(self.iqe130, 130.0, 100.0, (-30.0, 15))],
+                T=300,
+                M=12.0,
+                C_ms=0.02,
+                workdir=os.path.join(tmpdir, "multi"),
+                initdos=self.dos300,
+                MAX_ITERATION=5,
+            )
+            doslist = list(iterdos)
+        self.assertEqual(len(doslist), len(expected))
+        for dos1, dos2 in zip(doslist, expected):
+            np.testing.assert_allclose(dos1.I, dos2.I)
+        return
+
+    def test1a(self):
+        """multiphonon.backward.multiEi_sqe2dos: adaptive phonon order"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            iterdos = multiEi_sqe2dos.sqe2dos(
+                [(self.iqe130, 130.0, 100.0, (-30.0, 15))],
+                T=300,
+                M=12.0,
+                C_ms=0.02,
+                workdir=tmpdir,
+                initdos=self.dos300,
+                MAX_ITERATION=1,
+                records=True,
+                phonon_order_tol=1e-6,
+            )
+            dos, record = list(iterdos)[0]
+        self.assertGreater(record.phonon_order, 4)
+        return
+
+    def test2(self):
+        """multiphonon.backward.multiEi_sqe2dos: joint refinement against two Ei"""
+        from multiphonon import forward
+
+        forward.clear_cache()
+        with tempfile.TemporaryDirectory() as tmpdir, warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            iterdos = multiEi_sqe2dos.sqe2dos(
+                [
+                    (self.iqe30, 30.0, 25.0, (-5.0, 3.0)),
+                    multiEi_sqe2dos.Dataset(self.iqe130, 130.0, 100.0, (-30.0, 15)),
+                ],
+                T=300,
+                M=12.0,
+                C_ms=0.02,
+                workdir=tmpdir,
+                initdos=self.dos300,
+                MAX_ITERATION=10,
+                records=True,
+            )
+            results = list(iterdos)
+            self.assertTrue(os.path.exists(os.path.join(tmpdir, "final-dos.h5")))
+            for Ei in 30.0, 130.0:
+                self.assertTrue(os.path.exists(os.path.join(tmpdir, "Ei_%s" % Ei, "residual-sqe.h5")))
+        dos, record = results[-1]
+        self.assertEqual(record.stop, "converged")
+        self.assertEqual(dos.E.size, self.dos300.E.size)
+        self.assertAlmostEqual(dos.I.sum() * (dos.E[1] - dos.E[0]), 1.0)
+        # the forward evaluations of both datasets share A_n(E)
+        self.assertGreaterEqual(forward.cache_stats()["hits"], len(results))
+        # the input is not modified
+        self.assertTrue(np.array_equal(self.iqe30.I, hh.load(os.path.join(datadir, "graphite-Ei_30-iqe.h5")).I, True))
+        return
+
+    pass  # end of TestCase
+
+
+if __name__ == "__main__":
+    unittest.main()
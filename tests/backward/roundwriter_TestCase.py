@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+#
+
+import os
+import tempfile
+import unittest
+
+import numpy as np
+from histograms import make_dos, make_sqe
+from multiphonon.backward import roundwriter
+
+
+class TestCase(unittest.TestCase):
+    def test1(self):
+        """OutputPolicy"""
+        all_rounds = roundwriter.OutputPolicy("all")
+        self.assertTrue(all(all_rounds.should_write(i) for i in range(5)))
+        self.assertTrue(all_rounds.write_final)
+        none = roundwriter.OutputPolicy("none")
+        self.assertFalse(any(none.should_write(i) for i in range(5)))
+        self.assertFalse(none.write_final)
+        final = roundwriter.OutputPolicy("final")
+        self.assertFalse(any(final.should_write(i) for i in range(5)))
+        self.assertTrue(final.write_final)
+        every3 = roundwriter.OutputPolicy(3)
+        self.assertEqual([i for i in range(7) if every3.should_write(i)], [0, 3, 6])
+        with self.assertRaises(ValueError):
+            roundwriter.OutputPolicy("sometimes")
+        return
+
+    def test2(self):
+        """HDF5RoundWriter and readers of the consolidated file"""
+        with tempfile.TemporaryDirectory() as workdir:
+            writer = roundwriter.createRoundWriter(workdir, "hdf5")
+            mask = np.zeros((10, 20), dtype=bool)
+            mask[0] = True
+            for roundno in [0, 2, 4]:
+                sqes = [("exp-sqe", make_sqe(roundno)), ("mp-sqe", make_sqe(-roundno))]
+                writer.write(roundno, sqes, make_dos(roundno), mask)
+            writer.close()
+            path = os.path.join(workdir, roundwriter.CONSOLIDATED_FILENAME)
+            self.assertEqual(roundwriter.list_rounds(path), [0, 2, 4])
+            sqe = roundwriter.load_sqe(path, "mp-sqe.h5", 2)
+            self.assertTrue(np.isnan(sqe.I[0]).all())
+            self.assertTrue(np.allclose(sqe.I[1:], -2))
+            dos = roundwriter.load_dos(path)
+            self.assertTrue(np.allclose(dos.I, 4))
+            with self.assertRaises(KeyError):
+                roundwriter.load_dos(path, 3)
+        return
+
+    def test3(self):
+        """AsyncRoundWriter"""
+        with tempfile.TemporaryDirectory() as workdir:
+            writer = roundwriter.createRoundWriter(workdir, "hdf5", background=True)
+            mask = np.zeros((10, 20), dtype=bool)
+            sqe = make_sqe(1.0)
+            for roundno in range(5):
+                writer.write(roundno, [("exp-sqe", sqe)], make_dos(roundno), mask)
+                # modifying the histogram after handing it over does not affect the output
+                sqe.I *= 2
+            writer.close()
+            path = os.path.join(workdir, roundwriter.CONSOLIDATED_FILENAME)
+            self.assertEqual(roundwriter.list_rounds(path), list(range(5)))
+            self.assertTrue(np.allclose(roundwriter.load_sqe(path, "exp-sqe", 3).I, 8.0))
+        return
+
+    def test4(self):
+        """AsyncRoundWriter: errors are raised in the calling thread"""
+
+        class FailingWriter:
+            def write(self, roundno, sqes, dos, mask):
+                raise IOError("disk full")
+
+            def close(self):
+                return
+
+        writer = roundwriter.AsyncRoundWriter(FailingWriter())
+        mask = np.zeros((10, 20), dtype=bool)
+        writer.write(0, [("exp-sqe", make_sqe(1.0))], make_dos(0), mask)
+        with self.assertRaises(RuntimeError):
+            writer.flush()
+        writer.close()
+        return
+
+    def test5(self):
+        """HDF5RoundWriter: resume after a round"""
+        with tempfile.TemporaryDirectory() as workdir:
+            mask = np.zeros((10, 20), dtype=bool)
+            writer = roundwriter.createRoundWriter(workdir, "hdf5")
+            for roundno in range(4):
+                writer.write(roundno, [("exp-sqe", make_sqe(roundno))], make_dos(roundno), mask)
+            writer.close()
+            writer = roundwriter.createRoundWriter(workdir, "hdf5", resume_after=1)
+            writer.write(2, [("exp-sqe", make_sqe(20))], make_dos(20), mask)
+            writer.close()
+            path = os.path.join(workdir, roundwriter.CONSOLIDATED_FILENAME)
+            self.assertEqual(roundwriter.list_rounds(path), [0, 1, 2])
+            self.assertTrue(np.allclose(roundwriter.load_dos(path, 1).I, 1))
+            self.assertTrue(np.allclose(roundwriter.load_sqe(path, "exp-sqe", 2).I, 20))
+        return
+
+    def test6(self):
+        """HDF5RoundWriter keeps the floating point type of the histograms"""
+        import h5py
+
+        from multiphonon.sqe import astype
+
+        with tempfile.TemporaryDirectory() as workdir:
+            mask = np.zeros((10, 20), dtype=bool)
+            writer = roundwriter.createRoundWriter(workdir, "hdf5")
+            writer.write(0, [("exp-sqe", astype(make_sqe(1.0), "f"))], make_dos(1.0), mask)
+            writer.close()
+            path = os.path.join(workdir, roundwriter.CONSOLIDATED_FILENAME)
+            with h5py.File(path, "r") as f:
+                self.assertEqual(f["exp-sqe"]["I"].dtype, np.float32)
+                self.assertEqual(f["dos"]["I"].dtype, np.float64)
+            self.assertTrue(np.allclose(roundwriter.load_sqe(path, "exp-sqe", 0).I, 1.0))
+        return
+
+    def test6a(self):
+        """HDF5RoundWriter: load_sqe returns the floating point types of a sqe loaded through histogram.hdf"""
+        import histogram as H
+        import histogram.hdf as hh
+
+        from multiphonon.sqe import astype
+
+        with tempfile.TemporaryDirectory() as workdir:
+            hh.dump(make_sqe(2.0), os.path.join(workdir, "iqe.h5"))
+            # same conversion as in sqe2dos
+            iqe = hh.load(os.path.join(workdir, "iqe.h5"))
+            sqes = [("exp-sqe", astype(iqe, "f"))]
+            # errors of another type than the intensities
+            I = np.ones((10, 20), dtype="f")
+            sqes.append(("sp-sqe", H.histogram("sqe", iqe.axes(), data=I, errors=I.astype("d"))))
+            writer = roundwriter.createRoundWriter(workdir, "hdf5")
+            writer.write(0, sqes, make_dos(1.0), np.zeros((10, 20), dtype=bool))
+            writer.close()
+            path = os.path.join(workdir, roundwriter.CONSOLIDATED_FILENAME)
+            for name, sqe in sqes:
+                loaded = roundwriter.load_sqe(path, name)
+                self.assertEqual((loaded.I.dtype, loaded.E2.dtype), (sqe.I.dtype, sqe.E2.dtype))
+                self.assertTrue(np.array_equal(loaded.I, sqe.I))
+                self.assertTrue(np.array_equal(loaded.E2, sqe.E2))
+                continue
+        return
+
+    pass  # end of TestCase
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -95,6 +95,171 @@ class TestCase(unittest.TestCase):
                         pylab.plot(dos.E, dos.I, label="%d" % i)
             return
 
+    def test2a3(self):
+        """sqe2dos: V exp. only the final round, saved in the consolidated file"""
+        iqehist = hh.load(os.path.join(datadir, "V-iqe.h5"))
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            newiqe = interp(iqehist, newE=np.arange(-15, 80, 1.0))
+            work_dir = os.path.join(tmpdirname, "work-V")
+            iterdos = sqe2dos.sqe2dos(
+                newiqe,
+                T=300,
+                Ecutoff=55.0,
+                elastic_E_cutoff=(-12.0, 6.7),
+                M=50.94,
+                C_ms=0.2,
+                Ei=120.0,
+                workdir=work_dir,
+                intermediate_output="final",
+                intermediate_output_format="hdf5",
+            )
+            doslist = list(iterdos)
+            self.assertFalse(os.path.exists(os.path.join(work_dir, "round-0")))
+            from multiphonon.backward import roundwriter
+
+            consolidated = os.path.join(work_dir, roundwriter.CONSOLIDATED_FILENAME)
+            self.assertEqual(roundwriter.list_rounds(consolidated), [len(doslist) - 1])
+            path = os.path.join(here, "expected_results", "sqe2dos-test2a-final-dos.h5")
+            expected = hh.load(path)
+            self.assertTrue(np.allclose(doslist[-1].I, expected.I))
+            self.assertTrue(np.allclose(roundwriter.load_dos(consolidated).I, expected.I))
+            return
+
+    def test2a4(self):
+        """sqe2dos: V exp. resume from a checkpoint"""
+        iqehist = hh.load(os.path.join(datadir, "V-iqe.h5"))
+        kargs = dict(T=300, Ecutoff=55.0, elastic_E_cutoff=(-12.0, 6.7), M=50.94, C_ms=0.2, Ei=120.0)
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            work_dir = os.path.join(tmpdirname, "work-V")
+            # interrupted after 3 rounds
+            newiqe = interp(iqehist.copy(), newE=np.arange(-15, 80, 1.0))
+            doslist = list(sqe2dos.sqe2dos(newiqe, workdir=work_dir, MAX_ITERATION=3, checkpoint=True, **kargs))
+            self.assertEqual(len(doslist), 3)
+            # resume
+            newiqe = interp(iqehist.copy(), newE=np.arange(-15, 80, 1.0))
+            doslist = list(sqe2dos.sqe2dos(newiqe, workdir=work_dir, resume=True, **kargs))
+            path = os.path.join(here, "expected_results", "sqe2dos-test2a-final-dos.h5")
+            expected = hh.load(path)
+            self.assertTrue(np.allclose(doslist[-1].I, expected.I))
+            final_dos = hh.load(os.path.join(work_dir, "final-dos.h5"))
+            # converged. only the final steps are redone
+            os.remove(os.path.join(work_dir, "final-dos.h5"))
+            newiqe = interp(iqehist.copy(), newE=np.arange(-15, 80, 1.0))
+            self.assertEqual(list(sqe2dos.sqe2dos(newiqe, workdir=work_dir, resume=True, **kargs)), [])
+            self.assertTrue(np.allclose(hh.load(os.path.join(work_dir, "final-dos.h5")).E2, final_dos.E2))
+            # different parameters: start over
+            newiqe = interp(iqehist.copy(), newE=np.arange(-15, 80, 1.0))
+            kargs["C_ms"] = 0.3
+            with warnings.catch_warnings(record=True) as ws:
+                warnings.simplefilter("always")
+                next(sqe2dos.sqe2dos(newiqe, workdir=work_dir, resume=True, **kargs))
+            self.assertTrue(any("Not resuming" in str(w.message) for w in ws))
+            return
+
+    def test2a5(self):
+        """sqe2dos: V exp. Anderson mixing"""
+        from multiphonon.backward.mixing import AndersonMixing
+
+        iqehist = hh.load(os.path.join(datadir, "V-iqe.h5"))
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            newiqe = interp(iqehist.copy(), newE=np.arange(-15, 80, 1.0))
+            work_dir = os.path.join(tmpdirname, "work-V")
+            mixer = AndersonMixing(depth=3)
+            iterdos = sqe2dos.sqe2dos(
+                newiqe,
+                T=300,
+                Ecutoff=55.0,
+                elastic_E_cutoff=(-12.0, 6.7),
+                M=50.94,
+                C_ms=0.2,
+                Ei=120.0,
+                workdir=work_dir,
+                mixing=mixer,
+            )
+            doslist = list(iterdos)
+            self.assertEqual(len(mixer.residual_norms), len(doslist))
+            path = os.path.join(here, "expected_results", "sqe2dos-test2a-final-dos.h5")
+            expected = hh.load(path)
+            self.assertTrue(np.allclose(doslist[-1].I, expected.I, atol=expected.I.max() * 1e-3))
+            return
+
+    def test2a6(self):
+        """sqe2dos: V exp. per-round records and stopping rules"""
+        from multiphonon.backward import convergence
+
+        iqehist = hh.load(os.path.join(datadir, "V-iqe.h5"))
+        kargs = dict(T=300, Ecutoff=55.0, elastic_E_cutoff=(-12.0, 6.7), M=50.94, C_ms=0.2, Ei=120.0)
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            work_dir = os.path.join(tmpdirname, "work-V")
+            newiqe = interp(iqehist.copy(), newE=np.arange(-15, 80, 1.0))
+            output = list(sqe2dos.sqe2dos(newiqe, workdir=work_dir, records=True, **kargs))
+            doslist = [dos for dos, _ in output]
+            records = [record for _, record in output]
+            path = os.path.join(here, "expected_results", "sqe2dos-test2a-final-dos.h5")
+            expected = hh.load(path)
+            self.assertTrue(np.allclose(doslist[-1].I, expected.I))
+            self.assertEqual([r.roundno for r in records], list(range(len(records))))
+            self.assertEqual(records[-1].stop, "converged")
+            self.assertTrue(all(r.stop is None for r in records[:-1]))
+            self.assertTrue(records[-1].l2 <= records[1].l2)
+            self.assertEqual(set(records[0].timings), set(["singlephonon", "forward", "correction", "output"]))
+            # stop after the first round
+            newiqe = interp(iqehist.copy(), newE=np.arange(-15, 80, 1.0))
+            iterdos = sqe2dos.sqe2dos(newiqe, workdir=work_dir, stop=[convergence.TimeBudget(0)], **kargs)
+            self.assertEqual(len(list(iterdos)), 1)
+            self.assertEqual(records[0].phonon_order, 4)
+            # adaptive phonon order
+            newiqe = interp(iqehist.copy(), newE=np.arange(-15, 80, 1.0))
+            iterdos = sqe2dos.sqe2dos(
+                newiqe,
+                workdir=work_dir,
+                records=True,
+                stop=[convergence.TimeBudget(0)],
+                phonon_order_tol=1e-6,
+                **kargs,
+            )
+            output = list(iterdos)
+            self.assertEqual(len(output), 1)
+            self.assertGreater(output[0][1].phonon_order, 4)
+            return
+
+    def test2a7(self):
+        """sqe2dos: V exp. float32 vs float64"""
+        iqehist = hh.load(os.path.join(datadir, "V-iqe.h5"))
+        kargs = dict(T=300, Ecutoff=55.0, elastic_E_cutoff=(-12.0, 6.7), M=50.94, C_ms=0.2, Ei=120.0)
+        results = {}
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            for dtype in "d", "f":
+                work_dir = os.path.join(tmpdirname, "work-V-%s" % dtype)
+                newiqe = interp(iqehist.copy(), newE=np.arange(-15, 80, 1.0))
+                results[dtype] = list(sqe2dos.sqe2dos(newiqe, workdir=work_dir, dtype=dtype, **kargs))
+                continue
+        self.assertEqual(len(results["f"]), len(results["d"]))
+        dos64, dos32 = results["d"][-1], results["f"][-1]
+        self.assertTrue(np.allclose(dos32.I, dos64.I, rtol=0, atol=dos64.I.max() * 1e-4))
+        return
+
+    def test2a8(self):
+        """sqe2dos: V exp. the DOS-independent forward intermediates are reused across rounds"""
+        from multiphonon import forward
+
+        iqehist = hh.load(os.path.join(datadir, "V-iqe.h5"))
+        kargs = dict(T=300, Ecutoff=55.0, elastic_E_cutoff=(-12.0, 6.7), M=50.94, C_ms=0.2, Ei=120.0)
+        stats = []
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            for rounds in 1, 2:
+                forward.clear_cache()
+                newiqe = interp(iqehist.copy(), newE=np.arange(-15, 80, 1.0))
+                work_dir = os.path.join(tmpdirname, "work-V-%s" % rounds)
+                iterdos = sqe2dos.sqe2dos(newiqe, workdir=work_dir, MAX_ITERATION=rounds, **kargs)
+                self.assertEqual(len(list(iterdos)), rounds)
+                stats.append(forward.cache_stats())
+                continue
+        # the second round looks up the thermal factors and recoil energies of the first
+        self.assertGreater(stats[1]["hits"], stats[0]["hits"])
+        self.assertLess(stats[1]["misses"] - stats[0]["misses"], stats[0]["misses"])
+        return
+
     def test2b(self):
         iqehist = hh.load(os.path.join(datadir, "Al-iqe.h5"))
 
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+#
+
+import unittest
+
+import numpy as np
+
+from .phonon_TestCase4 import debyeDOS, kelvin2mev
+
+
+class TestCase(unittest.TestCase):
+    def test1(self):
+        """multiphonon.forward.cache.LRUCache"""
+        from multiphonon.forward.cache import LRUCache
+
+        cache = LRUCache(maxsize=2)
+        self.assertEqual(cache.get("a", lambda: 1), 1)
+        self.assertEqual(cache.get("b", lambda: 2), 2)
+        self.assertEqual(cache.get("a", lambda: -1), 1)
+        # "b" is the least recently used and is evicted
+        self.assertEqual(cache.get("c", lambda: 3), 3)
+        self.assertEqual(cache.get("b", lambda: 4), 4)
+        self.assertEqual(cache.stats(), dict(hits=1, misses=4, size=2, maxsize=2))
+        cache.resize(0)
+        self.assertEqual(len(cache), 0)
+        return
+
+    def test1a(self):
+        """multiphonon.forward.cache.LRUCache computes a key once for concurrent callers"""
+        import threading
+        from concurrent.futures import ThreadPoolExecutor
+
+        from multiphonon.forward.cache import LRUCache
+
+        cache = LRUCache(maxsize=2)
+        calls = []
+        started = threading.Event()
+        release = threading.Event()
+
+        def compute():
+            calls.append(1)
+            started.set()
+            release.wait()
+            return np.arange(3.0)
+
+        with ThreadPoolExecutor(4) as pool:
+            first = pool.submit(cache.get, "a", compute)
+            started.wait()
+            others = [pool.submit(cache.get, "a", compute) for i in range(3)]
+            release.set()
+            values = [first.result()] + [f.result() for f in others]
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(v is values[0] for v in values))
+        self.assertEqual(cache.stats()["misses"], 1)
+        self.assertEqual(cache.stats()["hits"], 3)
+        return
+
+    def test2(self):
+        """multiphonon.forward.phonon.computeSQETerms is memoized"""
+        from multiphonon import forward
+        from multiphonon.forward.phonon import computeSQETerms
+
+        E, g = debyeDOS()
+        dE = E[1] - E[0]
+        Q = np.arange(0, 10, 0.1)
+        beta = 1.0 / (300 * kelvin2mev)
+        forward.clear_cache()
+        E1, SnQ1, AnE1 = computeSQETerms(4, Q, E, dE, 50.0, g, beta)
+        # A_n(E), S_n(Q), the thermal table and the recoil energies
+        self.assertEqual(forward.cache_stats()["misses"], 4)
+        # same content in new arrays
+        hits = forward.cache_stats()["hits"]
+        E2, SnQ2, AnE2 = computeSQETerms(4, Q.copy(), E.copy(), dE, 50.0, g.copy(), beta)
+        self.assertEqual(forward.cache_stats()["hits"], hits + 2)
+        self.assertTrue(AnE1 is AnE2)
+        self.assertFalse(AnE1.flags.writeable)
+        # a different DOS misses A_n(E) and S_n(Q) only
+        computeSQETerms(4, Q, E, dE, 50.0, g * 1.001, beta)
+        self.assertEqual(forward.cache_stats()["misses"], 6)
+        return
+
+    pass  # end of TestCase
+
+
+if __name__ == "__main__":
+    unittest.main()
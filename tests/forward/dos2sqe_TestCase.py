@@ -37,6 +37,33 @@ class TestCase(unittest.TestCase):
             sqe = dos2sqe(doshist, 0.01, newiqe, 300, 50.94, 120.0)
             return
 
+    def test2(self):
+        """multiphonon.forward.dos2sqe: adaptive order"""
+        from dos import loadDOS
+
+        from multiphonon.forward import dos2sqe
+        from multiphonon.sqe import interp
+
+        E, g = loadDOS()
+        doshist = H.histogram("DOS", [H.axis("E", unit="meV", centers=E)], g)
+        iqe = hh.load(os.path.join(datadir, "V-iqe.h5"))
+        newiqe = interp(iqe, newE=np.arange(iqe.energy[0], 80.0, E[1] - E[0]))
+        orders = []
+        for T in 30.0, 300.0, 1500.0:
+            sqes = dos2sqe(doshist, 0.01, newiqe, T, 50.94, 120.0, tol=1e-4)
+            N = sqes[1].getAttribute("phonon_order")
+            expected = dos2sqe(doshist, 0.01, newiqe, T, 50.94, 120.0, N=N)
+            self.assertEqual(expected[1].getAttribute("phonon_order"), N)
+            for sqe1, sqe2 in zip(sqes, expected):
+                self.assertTrue(np.allclose(sqe1.I, sqe2.I, equal_nan=True))
+                continue
+            orders.append(N)
+            continue
+        # more orders at higher temperature
+        self.assertEqual(orders, sorted(orders))
+        self.assertLess(orders[0], orders[-1])
+        return
+
     pass  # end of TestCase
 
 
@@ -0,0 +1,241 @@
+#!/usr/bin/env python
+#
+
+import unittest
+
+import numpy as np
+
+kelvin2mev = 0.0862
+
+
+def debyeDOS(n=100, dE=0.5, cutoff=None):
+    """A Debye-like DOS on an expanded energy axis, normalized"""
+    E = np.arange(0, 3 * n * dE, dE)
+    cutoff = cutoff or n * dE * 0.8
+    g = E * E
+    g[E > cutoff] = 0
+    g /= g.sum() * dE
+    return E, g
+
+
+class TestCase(unittest.TestCase):
+    def test1(self):
+        """multiphonon.forward.phonon.computeAnESet: fft vs matrix"""
+        from multiphonon.forward.phonon import computeAnESet
+
+        E, g = debyeDOS()
+        dE = E[1] - E[0]
+        beta = 1.0 / (300 * kelvin2mev)
+        E1, An_matrix = computeAnESet(N=5, E=E, g=g, beta=beta, dE=dE, method="matrix")
+        E2, An_fft = computeAnESet(N=5, E=E, g=g, beta=beta, dE=dE, method="fft")
+        self.assertTrue(np.allclose(E1, E2))
+        self.assertTrue(np.allclose(An_matrix, An_fft))
+        return
+
+    def test1a(self):
+        """multiphonon.forward.phonon.computeAnESet: spectral vs fft"""
+        from multiphonon.forward.phonon import computeAnESet
+
+        # narrow DOS on a wide axis so that no A_n is truncated
+        E, g = debyeDOS(n=200, cutoff=12.0)
+        dE = E[1] - E[0]
+        beta = 1.0 / (300 * kelvin2mev)
+        E1, An_fft = computeAnESet(N=10, E=E, g=g, beta=beta, dE=dE, method="fft")
+        E2, An_spectral = computeAnESet(N=10, E=E, g=g, beta=beta, dE=dE, method="spectral")
+        self.assertTrue(np.allclose(E1, E2))
+        self.assertTrue(np.allclose(An_fft, An_spectral))
+        return
+
+    def test1b(self):
+        """multiphonon.forward.phonon.computeSQESet: summed"""
+        from multiphonon.forward.phonon import computeSQESet
+
+        E, g = debyeDOS()
+        dE = E[1] - E[0]
+        Q = np.arange(0, 10, 0.1)
+        dQ = Q[1] - Q[0]
+        beta = 1.0 / (300 * kelvin2mev)
+        Q1, E1, S_set = computeSQESet(5, Q, dQ, E, dE, 50.0, g, beta)
+        Q2, E2, S = computeSQESet(5, Q, dQ, E, dE, 50.0, g, beta, summed=True, starting_order=2)
+        self.assertEqual(S.shape, S_set.shape[1:])
+        self.assertTrue(np.allclose(S, S_set[1:].sum(axis=0)))
+        return
+
+    def test1c(self):
+        """multiphonon.forward.phonon.sqe_terms"""
+        from multiphonon.forward.phonon import sqe, sqe_terms, sumSQESet
+
+        E, g = debyeDOS()
+        E, g = E[:100], g[:100]
+        kwds = dict(T=300, M=50.0, Qmax=10.0, dQ=0.1)
+        Q, E2, SnQ_set, AnE_set = sqe_terms(E, g, N=4, **kwds)
+        self.assertEqual(SnQ_set.shape, (4, Q.size))
+        self.assertEqual(AnE_set.shape, (4, E2.size))
+        _, _, S1 = sqe(E, g, N=1, starting_order=1, **kwds)
+        self.assertTrue(np.allclose(sumSQESet(SnQ_set[:1], AnE_set[:1]), S1))
+        _, _, S2_4 = sqe(E, g, N=4, starting_order=2, **kwds)
+        self.assertTrue(np.allclose(sumSQESet(SnQ_set, AnE_set, 2), S2_4))
+        return
+
+    def test2(self):
+        """multiphonon.forward.phonon.fftconvolve"""
+        from multiphonon.forward.phonon import fftconvolve
+
+        a = np.random.rand(31)
+        b = np.random.rand(17)
+        self.assertTrue(np.allclose(fftconvolve(a, b), np.convolve(a, b)))
+        return
+
+    def test3(self):
+        """multiphonon.forward.phonon.sqe_multiT"""
+        from multiphonon.forward.phonon import sqe, sqe_multiT
+
+        E, g = debyeDOS()
+        E = E[:100]
+        g = g[:100]
+        T = np.array([10.0, 100.0, 300.0, 800.0])
+        for method in "fft", "spectral":
+            Q, E2, S = sqe_multiT(E, g.copy(), T, M=50, N=5, method=method)
+            self.assertEqual(S.shape, (T.size, Q.size, E2.size))
+            for S_T, T1 in zip(S, T):
+                Q1, E1, S1 = sqe(E, g.copy(), T=T1, M=50, N=5, method=method)
+                self.assertTrue(np.allclose(Q, Q1))
+                self.assertTrue(np.allclose(E2, E1))
+                self.assertTrue(np.allclose(S_T, S1, rtol=1e-10, atol=S1.max() * 1e-12))
+                continue
+        return
+
+    def test4(self):
+        """multiphonon.forward.phonon.sqe: float32 vs float64"""
+        from multiphonon.forward.phonon import computeAnESet, sqe
+
+        E, g = debyeDOS()
+        E, g = E[:100], g[:100]
+        for method in "fft", "matrix", "spectral":
+            Q, E2, S64 = sqe(E, g.copy(), T=300, M=50, N=5, method=method)
+            Q, E2, S32 = sqe(E, g.copy(), T=300, M=50, N=5, method=method, dtype=np.float32)
+            self.assertEqual(S32.dtype, np.float32)
+            self.assertTrue(np.allclose(S32, S64, rtol=0, atol=S64.max() * 1e-5))
+            continue
+        dE = E[1] - E[0]
+        beta = 1.0 / (300 * kelvin2mev)
+        E1, An = computeAnESet(N=5, E=E, g=g, beta=beta, dE=dE, method="matrix", dtype="f")
+        self.assertEqual(An.dtype, np.float32)
+        return
+
+    def test5(self):
+        """multiphonon.forward.phonon.sqe_blocks"""
+        from multiphonon.forward.phonon import sqe, sqe_blocks
+
+        E, g = debyeDOS()
+        E, g = E[:100], g[:100]
+        kwds = dict(T=300, M=50, N=5, Qmax=45.0, dQ=0.05)
+        Q, E2, S = sqe(E, g.copy(), **kwds)
+        blocks = list(sqe_blocks(E, g.copy(), blocksize=64, **kwds))
+        self.assertEqual([b[0].size for b in blocks[:-1]], [64] * (len(blocks) - 1))
+        self.assertTrue(np.array_equal(np.concatenate([b[0] for b in blocks]), Q))
+        self.assertTrue(np.allclose(np.concatenate([b[2] for b in blocks]), S))
+        return
+
+    def test6(self):
+        """multiphonon.forward.phonon.thermalTable"""
+        import warnings
+
+        from multiphonon.forward.phonon import coth, gamma0, thermalTable
+
+        x = np.array([-1000.0, -1.0, 1e-3, 0.5, 20.0, 1000.0])
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")
+            c = coth(x)
+        self.assertTrue(np.allclose(c, [-1.0, -1.0 / np.tanh(1.0), 1.0 / np.tanh(1e-3), 1.0 / np.tanh(0.5), 1.0, 1.0]))
+        E, g = debyeDOS()
+        dE = E[1] - E[0]
+        beta = 1.0 / (300 * kelvin2mev)
+        table = thermalTable(E, beta)
+        self.assertTrue(thermalTable(E.copy(), beta) is table)
+        self.assertFalse(table.coth_over_E.flags.writeable)
+        self.assertEqual(table.Er.size, 2 * E.size - 1)
+        # gamma0 = \int coth(E/2kBT) g(E)/E dE
+        f = np.cosh(beta * E[1:] / 2) / np.sinh(beta * E[1:] / 2) * g[1:] / E[1:]
+        expected = (f.sum() + f[0] - (f[1] - f[0])) * dE
+        self.assertAlmostEqual(gamma0(E, g, beta, dE), expected)
+        # the detailed balance factor of the positive axis
+        self.assertTrue(np.allclose(table.E_over_occupation, (1 - np.exp(-E * beta)) * E))
+        return
+
+    def test7(self):
+        """multiphonon.forward.phonon.computeSnQSet"""
+        import math
+        import warnings
+
+        from multiphonon.forward.phonon import computeSNQ, computeSnQSet
+
+        DW2 = np.linspace(0, 10, 101)
+        S = computeSnQSet(5, DW2)
+        self.assertEqual(S.shape, (5, DW2.size))
+        for n in range(1, 6):
+            expected = DW2**n * np.exp(-DW2) / math.factorial(n)
+            self.assertTrue(np.allclose(S[n - 1], expected, rtol=1e-12, atol=0))
+            self.assertTrue(np.allclose(computeSNQ(DW2, n), expected, rtol=1e-12, atol=0))
+            continue
+        # light atoms at high Q. DW2**n overflows the direct formula
+        DW2 = np.array([60.5, 150.5, 800.0])
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")
+            S = computeSnQSet(200, DW2)
+        self.assertTrue(np.isfinite(S).all())
+        # S_n(Q) is a Poisson distribution over n, peaked at n ~ 2W
+        self.assertEqual(list(S.argmax(axis=0) + 1), [60, 150, 200])
+        self.assertAlmostEqual(S[:, 0].sum(), 1.0)
+        # multiple temperatures
+        self.assertEqual(computeSnQSet(3, np.ones((2, 7))).shape, (3, 2, 7))
+        # Q=0
+        DW2 = np.array([0.0, 1.0, 2.0])
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")
+            with np.errstate(all="raise"):
+                self.assertTrue(np.allclose(computeSNQ(DW2, 0), np.exp(-DW2), rtol=1e-12, atol=0))
+                for n in 1, 3:
+                    self.assertEqual(computeSNQ(DW2, n)[0], 0)
+                    continue
+                self.assertTrue((computeSnQSet(3, DW2)[:, 0] == 0).all())
+        return
+
+    def test8(self):
+        """multiphonon.forward.phonon.truncationOrder"""
+        import warnings
+
+        from multiphonon.forward.phonon import computeSnQSet, sqe, sqe_order, sqe_terms, truncationOrder
+
+        DW2 = np.linspace(0, 3.0, 100)
+        N = truncationOrder(DW2, 1e-6)
+        Smax = computeSnQSet(N + 1, DW2).max(axis=1)
+        self.assertTrue((Smax[:N] >= 1e-6).all())
+        self.assertLess(Smax[N], 1e-6)
+        self.assertEqual(truncationOrder(np.zeros(10), 1e-6), 1)
+        # the orders beyond the maximum are not negligible
+        for DW2, maxorder in ([1000.0], 50), ([45.0], 50):
+            with warnings.catch_warnings(record=True) as ws:
+                warnings.simplefilter("always")
+                self.assertEqual(truncationOrder(DW2, 1e-6, maxorder=maxorder), maxorder)
+            self.assertEqual(len(ws), 1)
+            continue
+        # the order follows temperature, mass and Q range
+        E, g = debyeDOS()
+        E, g = E[:100], g[:100]
+        kwds = dict(Qmax=10.0, dQ=0.1, tol=1e-4)
+        orders = [sqe_order(E, g.copy(), T=T, M=M, **kwds) for T, M in [(10, 200), (300, 50), (1500, 10)]]
+        self.assertEqual(orders, sorted(orders))
+        self.assertGreater(orders[-1], 5)
+        # same as a fixed order
+        Q, E2, S = sqe(E, g.copy(), T=300, M=50, **kwds)
+        N = sqe_order(E, g.copy(), T=300, M=50, **kwds)
+        self.assertEqual(len(sqe_terms(E, g.copy(), T=300, M=50, **kwds)[2]), N)
+        self.assertTrue(np.allclose(S, sqe(E, g.copy(), T=300, M=50, N=N, Qmax=10.0, dQ=0.1)[2]))
+        return
+
+    pass  # end of TestCase
+
+
+if __name__ == "__main__":
+    unittest.main()
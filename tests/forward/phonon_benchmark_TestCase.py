@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+#
+# Benchmarks of the forward model. Run with "pytest -s" to see the timings.
+
+import time
+import unittest
+
+import numpy as np
+import pytest
+
+from .phonon_TestCase4 import debyeDOS, kelvin2mev
+
+pytestmark = pytest.mark.benchmark
+
+
+def timeit(f, repeat=3):
+    best = None
+    for i in range(repeat):
+        t0 = time.perf_counter()
+        res = f()
+        t = time.perf_counter() - t0
+        best = t if best is None else min(best, t)
+    return best, res
+
+
+class TestCase(unittest.TestCase):
+    def test_convolution(self):
+        """computeAnESet: dense convolution matrix vs FFT convolution"""
+        from multiphonon.forward.phonon import computeAnESet
+
+        beta = 1.0 / (300 * kelvin2mev)
+        print()
+        print("%10s %12s %12s %8s" % ("DOS size", "matrix (s)", "fft (s)", "speedup"))
+        for n in [50, 100, 200, 400]:
+            E, g = debyeDOS(n)
+            dE = E[1] - E[0]
+            t_matrix, (_, An_matrix) = timeit(lambda: computeAnESet(5, E, g, beta, dE, method="matrix"), repeat=1)
+            t_fft, (_, An_fft) = timeit(lambda: computeAnESet(5, E, g, beta, dE, method="fft"))
+            self.assertTrue(np.allclose(An_matrix, An_fft))
+            print("%10d %12.4g %12.4g %8.1f" % (n, t_matrix, t_fft, t_matrix / t_fft))
+            continue
+        return
+
+    def test_spectral(self):
+        """computeAnESet: order-by-order FFT convolution vs one spectral pass, N=10"""
+        from multiphonon.forward.phonon import computeAnESet
+
+        beta = 1.0 / (300 * kelvin2mev)
+        print()
+        print("%10s %12s %12s %12s" % ("DOS size", "matrix (s)", "fft (s)", "spectral (s)"))
+        for n in [100, 1000, 4000]:
+            E, g = debyeDOS(n)
+            dE = E[1] - E[0]
+            if n <= 100:
+                t_matrix, _ = timeit(lambda: computeAnESet(10, E, g, beta, dE, method="matrix"), repeat=1)
+            else:
+                t_matrix = np.nan
+            t_fft, _ = timeit(lambda: computeAnESet(10, E, g, beta, dE, method="fft"))
+            t_spectral, _ = timeit(lambda: computeAnESet(10, E, g, beta, dE, method="spectral"))
+            print("%10d %12.4g %12.4g %12.4g" % (n, t_matrix, t_fft, t_spectral))
+            continue
+        return
+
+    def test_A1E(self):
+        """computeA1E on 10k-point DOS grids, and reflected: list round-trip vs preallocated output"""
+        from multiphonon.forward import phonon
+
+        def reflected_lists(x, y):
+            # the previous implementation
+            def reflect(a, multiplier):
+                t = (multiplier * a).tolist()
+                t.reverse()
+                return np.concatenate((t, a[1:]), 0)
+
+            return reflect(x, -1), reflect(y, 1)
+
+        beta = 1.0 / (300 * kelvin2mev)
+        print()
+        print("%10s %14s %14s %14s" % ("DOS size", "lists (s)", "reflected (s)", "computeA1E (s)"))
+        for size in [1000, 10000, 30000]:
+            # debyeDOS(n) has 3n points
+            E, g = debyeDOS(size // 3, dE=0.01)
+            dE = E[1] - E[0]
+            t_lists, (x1, y1) = timeit(lambda: reflected_lists(E, g), repeat=5)
+            t_array, (x2, y2) = timeit(lambda: phonon.reflected(E, g), repeat=5)
+            self.assertTrue(np.array_equal(x1, x2))
+            self.assertTrue(np.array_equal(y1, y2))
+            g0 = phonon.gamma0(E, g, beta, dE)
+            t_A1E, _ = timeit(lambda: phonon.computeA1E(E, g, beta, dE, g0=g0), repeat=5)
+            print("%10d %14.4g %14.4g %14.4g" % (E.size, t_lists, t_array, t_A1E))
+            continue
+        return
+
+    pass  # end of TestCase
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -64,6 +64,26 @@ class TestCase(unittest.TestCase):
         )
         return
 
+    def test2a(self):
+        """multiphonon.getdos: MT can, parallel reduction"""
+        workdir = os.path.join(self.tmpdirname.name, "work-MT-parallel")
+        list(
+            getDOS(
+                os.path.join(datadir, "multiphonon-data", "ARCS_V_annulus.nxs"),
+                mt_nxs=os.path.join(datadir, "multiphonon-data", "ARCS_V_annulus.nxs"),
+                mt_fraction=0.01,
+                workdir=workdir,
+                parallel_reduction=True,
+            )
+        )
+        self.assertTrue(
+            close_hist(
+                hh.load(os.path.join(workdir, "final-dos.h5")),
+                hh.load(os.path.join(here, "expected_results", "getdos-test2-final-dos.h5")),
+            )
+        )
+        return
+
     def test3(self):
         """multiphonon.getdos: low T"""
         workdir = os.path.join(self.tmpdirname.name, "work-lowT")
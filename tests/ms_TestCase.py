@@ -6,6 +6,7 @@ import unittest
 
 import histogram as H
 import histogram.hdf as hh
+import numpy as np
 from multiphonon import ms
 
 interactive = False
@@ -21,6 +22,42 @@ class TestCase(unittest.TestCase):
             H.plot(mssqe, min=0)
         return
 
+    def test2(self):
+        """multiphonon.ms: precomputed mask. input is not modified"""
+        from multiphonon.sqe import dynamical_range_mask
+
+        mpsqe = hh.load(os.path.join(datadir, "V-S2..5.h5"))
+        I = mpsqe.I.copy()
+        mask = dynamical_range_mask(mpsqe, 110.0)
+        mssqe1 = ms.sqe(mpsqe, Ei=110.0, mask=mask)
+        mssqe2 = ms.sqe(mpsqe, Ei=110.0)
+        self.assertTrue(np.array_equal(mpsqe.I, I, equal_nan=True))
+        self.assertTrue(np.array_equal(mssqe1.I, mssqe2.I, equal_nan=True))
+        self.assertTrue(np.isnan(mssqe1.I[mask]).all())
+        return
+
+    def test3(self):
+        """multiphonon.ms.average_over_Q: from Q blocks"""
+        from multiphonon.forward.phonon import sqe, sqe_blocks
+        from multiphonon.sqe import dynamical_range_mask_QE
+
+        E = np.arange(0, 50, 0.5)
+        g = E * E
+        g[E > 40] = 0
+        kwds = dict(T=300, M=50.0, Qmax=15.0, dQ=0.1)
+        Q, E2, S = sqe(E, g.copy(), **kwds)
+        mask = dynamical_range_mask_QE(Q, E2, 110.0)
+        expected = ms.average_over_Q([(slice(None), S)], mask)
+        start = 0
+        blocks = []
+        for Qblock, E2, Sblock in sqe_blocks(E, g.copy(), blocksize=7, **kwds):
+            blocks.append((slice(start, start + Qblock.size), Sblock))
+            start += Qblock.size
+            continue
+        self.assertEqual(start, Q.size)
+        self.assertTrue(np.allclose(ms.average_over_Q(blocks, mask), expected, equal_nan=True))
+        return
+
     pass  # end of TestCase
 
 
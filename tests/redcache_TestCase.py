@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+#
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from multiphonon import redcache
+
+
+class TestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        return
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+        return
+
+    def _write(self, fn, content):
+        path = os.path.join(self.tmpdir, fn)
+        with open(path, "wb") as stream:
+            stream.write(content)
+        return path
+
+    def test1(self):
+        """multiphonon.redcache.fileFingerprint depends on content only"""
+        a = self._write("a.nxs", b"raw data")
+        b = self._write("b.nxs", b"raw data")
+        self.assertEqual(redcache.fileFingerprint(a), redcache.fileFingerprint(b))
+        # overwritten in place
+        st = os.stat(a)
+        self._write("a.nxs", b"new data")
+        os.utime(a, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+        self.assertNotEqual(redcache.fileFingerprint(a), redcache.fileFingerprint(b))
+        return
+
+    def test2(self):
+        """ReductionCache get/put"""
+        cache = redcache.ReductionCache(os.path.join(self.tmpdir, "cache"))
+        src = self._write("iqe.h5", b"iqe")
+        dest = os.path.join(self.tmpdir, "copy.h5")
+        self.assertFalse(cache.get("key", dest))
+        cache.put("key", src)
+        self.assertTrue(cache.get("key", dest))
+        with open(dest, "rb") as stream:
+            self.assertEqual(stream.read(), b"iqe")
+        return
+
+    def test3(self):
+        """ReductionCache evicts least recently used entries"""
+        cache = redcache.ReductionCache(os.path.join(self.tmpdir, "cache"), maxsize=25)
+        src = self._write("iqe.h5", b"0123456789")
+        dest = os.path.join(self.tmpdir, "copy.h5")
+        now = time.time()
+        for i, key in enumerate(["a", "b"]):
+            cache.put(key, src)
+            os.utime(cache._entry(key), (now - 100 + i, now - 100 + i))
+            continue
+        # use "a", so "b" becomes the least recently used
+        self.assertTrue(cache.get("a", dest))
+        cache.put("c", src)
+        self.assertTrue(cache.get("a", dest))
+        self.assertFalse(cache.get("b", dest))
+        self.assertTrue(cache.get("c", dest))
+        return
+
+    def test4(self):
+        """multiphonon.redcache.defaultCache is configured by the environment"""
+        saved = os.environ.get("MULTIPHONON_REDUCTION_CACHE")
+        try:
+            os.environ["MULTIPHONON_REDUCTION_CACHE"] = ""
+            self.assertIsNone(redcache.defaultCache())
+            os.environ["MULTIPHONON_REDUCTION_CACHE"] = self.tmpdir
+            self.assertEqual(redcache.defaultCache().path, self.tmpdir)
+        finally:
+            if saved is None:
+                del os.environ["MULTIPHONON_REDUCTION_CACHE"]
+            else:
+                os.environ["MULTIPHONON_REDUCTION_CACHE"] = saved
+        return
+
+    def test5(self):
+        """ReductionCache.fileFingerprint is saved in the cache directory"""
+        cache = redcache.ReductionCache(os.path.join(self.tmpdir, "cache"))
+        a = self._write("a.nxs", b"raw data")
+        fingerprint = redcache.fileFingerprint(a)
+        self.assertEqual(cache.fileFingerprint(a), fingerprint)
+        # another process. the file is not read again
+        redcache._fingerprints.clear()
+        saved = redcache.fileFingerprint
+        redcache.fileFingerprint = None
+        try:
+            self.assertEqual(redcache.ReductionCache(cache.path).fileFingerprint(a), fingerprint)
+        finally:
+            redcache.fileFingerprint = saved
+        # overwritten in place
+        st = os.stat(a)
+        self._write("a.nxs", b"new data")
+        os.utime(a, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+        self.assertNotEqual(cache.fileFingerprint(a), fingerprint)
+        return
+
+    pass  # end of TestCase
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+#
+
+import os
+import tempfile
+import unittest
+
+import h5py
+
+from multiphonon import redutils
+
+
+class TestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        return
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+        return
+
+    def _create(self, fn, roots):
+        path = os.path.join(self.tmpdir.name, fn)
+        with h5py.File(path, "w") as f:
+            for root in roots:
+                f.create_group(root)
+        return path
+
+    def test1(self):
+        """multiphonon.redutils.isRawNexus"""
+        raw = self._create("raw.nxs", ["entry"])
+        processed = self._create("processed.nxs", ["mantid_workspace_1"])
+        self.assertTrue(redutils.isRawNexus(raw))
+        self.assertFalse(redutils.isRawNexus(processed))
+        return
+
+    def test2(self):
+        """The verdict is cached by path and mtime"""
+        path = self._create("data.nxs", ["entry"])
+        self.assertTrue(redutils.isRawNexus(path))
+        self.assertIn(os.path.abspath(path), redutils._nexus_kinds)
+        # same mtime: cached verdict
+        st = os.stat(path)
+        self._create("data.nxs", ["mantid_workspace_1"])
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns))
+        self.assertTrue(redutils.isRawNexus(path))
+        # new mtime: file is classified again
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+        self.assertFalse(redutils.isRawNexus(path))
+        return
+
+    pass  # end of TestCase
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -7,7 +7,7 @@ import unittest
 
 import histogram.hdf as hh
 import numpy as np
-from multiphonon.sqe import dynamical_range_mask, interp
+from multiphonon.sqe import dynamical_range_mask, dynamical_range_mask_QE, interp
 
 interactive = False
 datadir = os.path.join(os.path.dirname(__file__), "../data")
@@ -29,6 +29,25 @@ class TestCase(unittest.TestCase):
             pylab.show()
         return
 
+    def test3(self):
+        """dynamical_range_mask_QE vs. direct evaluation of the kinematic limits"""
+        from multiphonon.units.neutron import SE2K, e2k
+
+        Q = np.arange(0, 15, 0.1)
+        E = np.arange(-50, 150, 1.0)
+        Ei = 120.0
+        mask = dynamical_range_mask_QE(Q, E, Ei)
+        ki = e2k(Ei)
+        for i, q in enumerate(Q):
+            for j, e in enumerate(E):
+                if e >= Ei:
+                    self.assertTrue(mask[i, j])
+                    continue
+                kf = (Ei - e) ** 0.5 * SE2K
+                inside = abs(ki - kf) < q < ki + kf
+                self.assertEqual(mask[i, j], not inside)
+        return
+
     pass  # end of TestCase
 
 
@@ -13,6 +13,50 @@ interactive = False
 datadir = os.path.join(os.path.dirname(__file__), "../data")
 
 
+def interp_per_Q(iqehist, newE):
+    """The implementation of multiphonon.sqe.interp before it was vectorized, for comparison"""
+    import histogram as H
+    from scipy import interpolate
+
+    mask = iqehist.I != iqehist.I
+
+    def get_boundary_indexes(a):
+        nz = np.nonzero(a)[0]
+        if nz.size:
+            return nz[0], nz[-1]
+        else:
+            return 0, 0
+
+    boundary_indexes = [get_boundary_indexes(row) for row in np.logical_not(mask)]
+    try:
+        E = iqehist.energy
+    except AttributeError:
+        E = iqehist.E
+    Eranges = [(E[ind1], E[ind2]) for ind1, ind2 in boundary_indexes]
+    iqehist.I[mask] = 0
+    iqehist.E2[mask] = 0
+    Q = iqehist.Q
+    f = interpolate.RectBivariateSpline(E, Q, iqehist.I.T, kx=1, ky=1)
+    E2f = interpolate.RectBivariateSpline(E, Q, iqehist.E2.T, kx=1, ky=1)
+    newS = f(newE, Q).T
+    newS_E2 = E2f(newE, Q).T
+    Eaxis = H.axis("E", newE, unit="meV")
+    Qaxis = H.axis("Q", Q, unit="1./angstrom")
+    newHist = H.histogram("IQE", [Qaxis, Eaxis], data=newS, errors=newS_E2)
+    for Erange, q in zip(Eranges, Q):
+        Emin, Emax = Erange
+        if Emin > newE[0]:
+            Emin = min(Emin, newE[-1])
+            newHist[q, (None, Emin)].I[:] = np.nan
+            newHist[q, (None, Emin)].E2[:] = np.nan
+        if Emax < newE[-1]:
+            Emax = max(Emax, newE[0])
+            newHist[q, (Emax, None)].I[:] = np.nan
+            newHist[q, (Emax, None)].E2[:] = np.nan
+        continue
+    return newHist
+
+
 class TestCase(unittest.TestCase):
     @pytest.mark.creates_extra_files
     def test1(self):
@@ -24,6 +68,45 @@ class TestCase(unittest.TestCase):
             hh.dump(newsqe, newsqe_filepath)
             return
 
+    def test2(self):
+        """multiphonon.sqe.interp_along_E"""
+        from multiphonon.sqe import interp_along_E
+
+        E = np.arange(-10, 10, 1.0)
+        I = np.random.rand(5, E.size)
+        newE = np.arange(-12.5, 12, 0.3)
+        expected = np.array([np.interp(newE, E, row) for row in I])
+        self.assertTrue(np.allclose(interp_along_E(E, I, newE), expected))
+        return
+
+    def test3(self):
+        """multiphonon.sqe.interp: same as the per-Q implementation, including the NaN edges"""
+        import histogram as H
+
+        Q = np.arange(0, 5, 0.5)
+        E = np.arange(-10, 10, 1.0)
+        I = np.random.rand(Q.size, E.size)
+        # a dynamical range that narrows with Q, an empty row, and a row with NaNs on one side
+        for i, n in enumerate([0, 1, 2, 3, 5, 7, 9]):
+            I[i, :n] = I[i, E.size - n :] = np.nan
+        I[7] = np.nan
+        I[8, :4] = np.nan
+        sqe = H.histogram("IQE", [("Q", Q, "1./angstrom"), ("E", E, "meV")], data=I, errors=I * 0.1)
+        V = hh.load(os.path.join(datadir, "V-iqe.h5"))
+        for iqe, newEs in [
+            (sqe, [np.arange(-12, 12, 0.5), np.arange(-9.3, 9, 0.7), np.arange(-5, 5, 1.0)]),
+            (V, [np.arange(-70, 70, 1.0), np.arange(-15, 80, 0.7)]),
+        ]:
+            for newE in newEs:
+                newsqe = interp(iqe.copy(), newE)
+                expected = interp_per_Q(iqe.copy(), newE)
+                self.assertTrue(np.array_equal(np.isnan(newsqe.I), np.isnan(expected.I)))
+                self.assertTrue(np.allclose(newsqe.I, expected.I, equal_nan=True))
+                self.assertTrue(np.allclose(newsqe.E2, expected.E2, equal_nan=True))
+                continue
+            continue
+        return
+
     pass  # end of TestCase
 
 
@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+#
+# Benchmark of the import time. The timings are given in the messages of failed checks.
+
+import subprocess as sp
+import sys
+import time
+import unittest
+
+import pytest
+
+pytestmark = pytest.mark.benchmark
+
+
+def import_time(statement):
+    t0 = time.perf_counter()
+    out = sp.check_output([sys.executable, "-c", statement])
+    return time.perf_counter() - t0, out.decode().strip()
+
+
+class TestCase(unittest.TestCase):
+    def test1(self):
+        """Importing multiphonon.redutils does not import or check mantid"""
+        statement = "import sys, multiphonon.redutils as r; print('mantid' in sys.modules, r.mantid_checked)"
+        t, out = import_time(statement)
+        self.assertEqual(out, "False False", "import multiphonon.redutils: %.3g s" % t)
+        return
+
+    def test2(self):
+        """Startup time of multiphonon.getdos"""
+        baseline, _ = import_time("import numpy")
+        t, out = import_time("import sys, multiphonon.getdos; print('mantid' in sys.modules)")
+        msg = "import numpy: %.3g s, import multiphonon.getdos: %.3g s" % (baseline, t)
+        self.assertEqual(out, "False", msg)
+        self.assertLess(t - baseline, 5.0, msg)
+        return
+
+    pass  # end of TestCase
+
+
+if __name__ == "__main__":
+    unittest.main()
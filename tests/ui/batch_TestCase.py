@@ -45,6 +45,27 @@ class TestCase(unittest.TestCase):
 
             return
 
+    def test2(self):
+        """multiphonon.ui.batch: parallel, shared MT, skip finished jobs"""
+        nxs = os.path.join(datadir, "multiphonon-data", "ARCS_V_annulus.nxs")
+        if not os.path.exists(nxs):
+            raise RuntimeError("file ARCS_V_annulus.nxs is missing")
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            sample_nxs_list = [nxs, nxs, os.path.join(tmpdirname, "missing.nxs")]
+            mt_nxs_list = [None, nxs, nxs]
+            params = os.path.join(here, "V-params.yaml")
+            results = batch.process(sample_nxs_list, mt_nxs_list, params, tmpdirname, workers=3)
+            self.assertEqual([status for _, status in results], ["done", "done", "failed"])
+            self.assertTrue(
+                np.allclose(
+                    hh.load(os.path.join(tmpdirname, "work-ARCS_V_annulus.nxs,None/final-dos.h5")).I,
+                    hh.load(os.path.join(here, "expected_results", "batch-1-final-dos.h5")).I,
+                )
+            )
+            results = batch.process(sample_nxs_list, mt_nxs_list, params, tmpdirname, workers=3)
+            self.assertEqual([status for _, status in results], ["skipped", "skipped", "failed"])
+        return
+
     pass  # end of TestCase
 
 
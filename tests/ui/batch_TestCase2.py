@@ -0,0 +1,37 @@
+#!/usr/bin/env python
+#
+
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from multiphonon.ui import batch
+
+
+def runJob(kargs, report):
+    """Stand-in of batch._runJob. The job of sample "crash.nxs" kills its worker"""
+    if kargs["sample_nxs"] == "crash.nxs":
+        os._exit(1)
+    time.sleep(0.5)
+    return
+
+
+class TestCase(unittest.TestCase):
+    def test1(self):
+        """multiphonon.ui.batch._schedule: a worker crash fails only the job that caused it"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            samples = ["1.nxs", "2.nxs", "crash.nxs", "3.nxs", "4.nxs", "5.nxs"]
+            jobs = [dict(sample_nxs=s, mt_nxs=None, workdir=os.path.join(tmpdir, s)) for s in samples]
+            with mock.patch.object(batch, "_runJob", runJob):
+                statuses = batch._schedule(jobs, [], tmpdir, workers=2)
+        expected = ["failed" if s == "crash.nxs" else "done" for s in samples]
+        self.assertEqual([statuses[job["workdir"]] for job in jobs], expected)
+        return
+
+    pass  # end of TestCase
+
+
+if __name__ == "__main__":
+    unittest.main()